@@ -5,8 +5,11 @@ from pathlib import Path
 
 from utils.plot_trace import plot_trace
 from utils.runners import run_session
+from utils.trace_format import save_trace
 
 RESULTS_DIR = Path("eval_results")
+# format to save the session traces in: "json" or "npz" (compressed, load with utils.trace_format.load_trace)
+TRACE_FORMAT = "json"
 if not RESULTS_DIR.exists():
     RESULTS_DIR.mkdir(parents=True)
 
@@ -101,12 +104,11 @@ for domain_name, profiles in domains.items():
             )
 
         # write results to file
-        with open(
-            negotiation_results_dir.joinpath("session_results_trace.json"),
-            "w",
-            encoding="utf-8",
-        ) as f:
-            f.write(json.dumps(session_results_trace, indent=2))
+        save_trace(
+            session_results_trace,
+            negotiation_results_dir.joinpath("session_results_trace"),
+            TRACE_FORMAT,
+        )
         with open(
             negotiation_results_dir.joinpath("session_results_summary.json"),
             "w",
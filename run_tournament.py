@@ -15,6 +15,14 @@ if not RESULTS_DIR.exists():
 #   You need to specify the classpath of 2 agents to start a negotiation. Parameters for the agent can be added as a dict (see example)
 #   You need to specify the preference profiles for both agents. The first profile will be assigned to the first agent.
 #   You need to specify a time deadline (is milliseconds (ms)) we are allowed to negotiate before we end without agreement.
+#   Optionally, you can specify a round deadline ("deadline_rounds"), the time deadline is then only a safety limit.
+#   Round deadlines give reproducible results that do not depend on the CPU load, but only work for agents that advance ProgressRounds.
+#   Optionally, you can run the sessions with the in-process SAOP engine ("engine": "fast") instead of the geniusweb runner.
+#   Optionally, you can measure the time agents take to handle every message ("measure_latency"), which is added to the results.
+#   Optionally, you can measure the memory agents allocate ("measure_memory"), which slows down the agents, but shows memory hogs.
+#   Optionally, you can measure the time of every phase of a session ("measure_phases"), to see the overhead of the protocol.
+#   Optionally, you can keep the log messages in memory instead of printing them ("buffered_logs"), they are only written to a log file if a session ends with an error (or always with "flush").
+#   Optionally, you can profile the agents with cProfile ("profile_agents"), the profiles are merged per agent into a report in the given directory.
 tournament_settings = {
     "agents": [
         {
@@ -125,6 +133,13 @@ tournament_settings = {
         ["domains/domain02/profileA.json", "domains/domain02/profileB.json"]
     ],
     "deadline_time_ms": 10000,
+    # "deadline_rounds": 1000,
+    # "engine": "fast",
+    # "measure_latency": True,
+    # "measure_memory": True,
+    # "measure_phases": True,
+    # "buffered_logs": {"log_dir": str(RESULTS_DIR.joinpath("session_logs")), "level": "INFO", "flush": False},
+    # "profile_agents": str(RESULTS_DIR.joinpath("agent_profiles")),
 }
 
 # run a session and obtain results in dictionaries
@@ -1,16 +1,188 @@
-import json
-import os
+import argparse
+import secrets
 from pathlib import Path
 import time
-from multiprocessing import Pool, freeze_support
+from multiprocessing import freeze_support
 
-from utils.runners_parallel import run_tournament
+from utils.concurrency import BASELINE_PAIRS
+from utils.runners_parallel import run_tournament, run_tournament_worker
+
+
+def parse_address(address: str):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def parse_range(value: str):
+    low, high = value.split(":", 1)
+    return int(low), int(high)
 
 
 if __name__ == '__main__':
     freeze_support()
-    
-    RESULTS_DIR = Path("results", time.strftime('%Y%m%d-%H%M%S'))
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--resume",
+        metavar="RESULTS_DIR",
+        help="resume an interrupted tournament from the session journal in this results directory",
+    )
+    parser.add_argument(
+        "--save-traces",
+        action="store_true",
+        help="save the full negotiation trace of every session to the traces directory",
+    )
+    parser.add_argument(
+        "--trace-format",
+        choices=["json", "npz"],
+        default="json",
+        help="file format of the saved traces, npz is a compressed columnar format (default: json)",
+    )
+    parser.add_argument(
+        "--deadline-rounds",
+        type=int,
+        metavar="N",
+        help="end sessions after N rounds instead of at the time deadline (which then only is a safety limit)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["geniusweb", "fast"],
+        default="geniusweb",
+        help="run sessions with the geniusweb runner or the lightweight in-process SAOP engine (default: geniusweb)",
+    )
+    parser.add_argument(
+        "--multiplex",
+        type=int,
+        metavar="N",
+        help="run N sessions concurrently in every worker process (requires --engine fast and --deadline-rounds)",
+    )
+    parser.add_argument(
+        "--measure-latency",
+        action="store_true",
+        help="measure the time agents take to handle every message and add it to the results",
+    )
+    parser.add_argument(
+        "--measure-memory",
+        action="store_true",
+        help="measure the memory agents allocate (tracemalloc) and add it to the results",
+    )
+    parser.add_argument(
+        "--measure-phases",
+        action="store_true",
+        help="measure the time of every phase of the sessions (protocol overhead) and add it to the results",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="keep the log messages of sessions in memory and only write them to a log file if a session ends with an error "
+        "(sessions that are killed at the timeout have no log file)",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        help="minimum level of the log messages to keep with --quiet (default: INFO)",
+    )
+    parser.add_argument(
+        "--flush-logs",
+        action="store_true",
+        help="with --quiet, write the log file of every session",
+    )
+    parser.add_argument(
+        "--profile-agents",
+        action="store_true",
+        help="profile the agents with cProfile and write a report of their hot functions",
+    )
+    parser.add_argument(
+        "--timeout-grace",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help="kill a session when it runs this long past its deadline (default: 60)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        metavar="N",
+        help="number of sessions to run in parallel on this host (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--pin-cpus",
+        action="store_true",
+        help="pin every worker process to its own CPU core and limit BLAS/OpenMP libraries to one thread per worker",
+    )
+    parser.add_argument(
+        "--adaptive-concurrency",
+        type=parse_range,
+        metavar="FLOOR:CEILING",
+        help="adapt the number of parallel sessions between FLOOR and CEILING to keep the rounds per second of "
+        "agent pairs close to a serial baseline (a session of a few agent pairs runs alone at the start)",
+    )
+    parser.add_argument(
+        "--baseline-pairs",
+        type=int,
+        metavar="N",
+        default=BASELINE_PAIRS,
+        help=f"with --adaptive-concurrency, measure the serial baseline of N agent pairs (default: {BASELINE_PAIRS})",
+    )
+    parser.add_argument(
+        "--preload-agents",
+        action="store_true",
+        help="import all agents once at worker start instead of in every session",
+    )
+    parser.add_argument(
+        "--max-sessions-per-worker",
+        type=int,
+        metavar="N",
+        help="replace a worker process after it ran this many sessions",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="take sessions of unchanged agents and profiles from the result cache (results/session_cache)",
+    )
+    parser.add_argument(
+        "--force-rerun",
+        action="store_true",
+        help="run all sessions again and refresh their entries in the result cache",
+    )
+    parser.add_argument(
+        "--serve",
+        type=parse_address,
+        metavar="HOST:PORT",
+        help="serve the tournament sessions to workers on other hosts instead of running them locally",
+    )
+    parser.add_argument(
+        "--worker",
+        type=parse_address,
+        metavar="HOST:PORT",
+        help="run sessions of a tournament served by another host",
+    )
+    parser.add_argument(
+        "--authkey",
+        help="authentication key shared between the serving host and the workers (required with --worker, "
+        "a random key is generated and printed for --serve if not given)",
+    )
+    args = parser.parse_args()
+
+    # the workers unpickle the jobs they receive, so never serve them with a guessable key
+    if args.worker and not args.authkey:
+        parser.error("--worker requires the --authkey of the serving host")
+    if args.serve and not args.authkey:
+        args.authkey = secrets.token_hex(16)
+        print(f"Start the workers with --authkey {args.authkey}")
+
+    if args.worker:
+        run_tournament_worker(
+            args.worker, args.authkey.encode(), args.processes, args.pin_cpus
+        )
+        exit()
+
+    if args.resume:
+        RESULTS_DIR = Path(args.resume)
+        if not RESULTS_DIR.joinpath("session_journal.jsonl").exists():
+            raise FileNotFoundError(f"No session journal found in {RESULTS_DIR}")
+    else:
+        RESULTS_DIR = Path("results", time.strftime('%Y%m%d-%H%M%S'))
     # create results directory if it does not exist
     if not RESULTS_DIR.exists():
         RESULTS_DIR.mkdir(parents=True)
@@ -19,6 +191,9 @@ if __name__ == '__main__':
     #   You need to specify the classpath of 2 agents to start a negotiation. Parameters for the agent can be added as a dict (see example)
     #   You need to specify the preference profiles for both agents. The first profile will be assigned to the first agent.
     #   You need to specify a time deadline (is milliseconds (ms)) we are allowed to negotiate before we end without agreement.
+    #   Optionally, you can specify a round deadline ("deadline_rounds"), the time deadline is then only a safety limit.
+    #   Round deadlines give reproducible results that do not depend on the CPU load, but only work for agents that advance ProgressRounds.
+    #   Optionally, you can run the sessions with the in-process SAOP engine ("engine": "fast") instead of the geniusweb runner.
     tournament_settings = {
         "agents": [
             {
@@ -128,16 +303,47 @@ if __name__ == '__main__':
             # ["domains/domain01/profileA.json", "domains/domain01/profileB.json"],
         ],
         "deadline_time_ms": 10000,
+        "repetitions": 1,
     }
+    if args.deadline_rounds:
+        tournament_settings["deadline_rounds"] = args.deadline_rounds
+    if args.engine != "geniusweb":
+        tournament_settings["engine"] = args.engine
+    if args.measure_latency:
+        tournament_settings["measure_latency"] = True
+    if args.measure_memory:
+        tournament_settings["measure_memory"] = True
+    if args.measure_phases:
+        tournament_settings["measure_phases"] = True
+    if args.quiet:
+        tournament_settings["buffered_logs"] = {
+            "log_dir": str(RESULTS_DIR.joinpath("session_logs")),
+            "level": args.log_level.upper(),
+            "flush": args.flush_logs,
+        }
+    if args.profile_agents:
+        tournament_settings["profile_agents"] = str(RESULTS_DIR.joinpath("agent_profiles"))
 
     # run a session and obtain results in dictionaries
-    tournament_steps, tournament_results, tournament_results_summary = run_tournament(tournament_settings)
-
-    # save the tournament settings for reference
-    with open(RESULTS_DIR.joinpath("tournament_steps.json"), "w", encoding="utf-8") as f:
-        f.write(json.dumps(tournament_steps, indent=2))
-    # save the tournament results
-    with open(RESULTS_DIR.joinpath("tournament_results.json"), "w", encoding="utf-8") as f:
-        f.write(json.dumps(tournament_results, indent=2))
-    # save the tournament results summary
-    tournament_results_summary.to_csv(RESULTS_DIR.joinpath("tournament_results_summary.csv"))
\ No newline at end of file
+    # every finished session is written to the journal, so the tournament can be resumed with --resume.
+    # the tournament steps, results and summary are written to the results directory while the tournament runs.
+    tournament_results_summary = run_tournament(
+        tournament_settings,
+        RESULTS_DIR,
+        resume=bool(args.resume),
+        save_traces=args.save_traces,
+        trace_format=args.trace_format,
+        timeout_grace_s=args.timeout_grace,
+        processes=args.processes,
+        preload_agents=args.preload_agents,
+        maxtasksperchild=args.max_sessions_per_worker,
+        pin_cpus=args.pin_cpus,
+        concurrency_range=args.adaptive_concurrency,
+        baseline_pairs=args.baseline_pairs,
+        multiplex=args.multiplex,
+        serve_address=args.serve,
+        authkey=args.authkey.encode() if args.authkey else None,
+        cache_dir=Path("results", "session_cache") if args.cache else None,
+        force_rerun=args.force_rerun,
+    )
+    print(tournament_results_summary)
@@ -0,0 +1,97 @@
+import logging
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from geniusweb.party.DefaultParty import DefaultParty
+from tudelft_utilities_logging.Reporter import Reporter
+
+
+class BufferedReporter(Reporter):
+    """Reporter that keeps the log messages of a session in a bounded in-memory buffer
+    instead of writing them to stdout. Messages below `level` are dropped and when the
+    buffer is full, the oldest messages are dropped. The buffer can be written to a log
+    file with `flush`, e.g. when the session failed.
+    """
+
+    def __init__(self, level: int = logging.INFO, capacity: int = 1000):
+        self.level = level
+        self.records = deque(maxlen=capacity)
+        self.num_dropped = 0
+
+    def log(self, level: int, msg: str, exc: Optional[BaseException] = None):
+        if level < self.level:
+            return
+        if len(self.records) == self.records.maxlen:
+            self.num_dropped += 1
+        self.records.append((time.time(), level, msg, exc))
+
+    def flush(self, log_file) -> Path:
+        """Write the buffered messages to a log file and empty the buffer.
+
+        Args:
+            log_file (str | Path): path of the log file
+
+        Returns:
+            Path: path of the log file
+        """
+        log_file = Path(log_file)
+        if not log_file.parent.exists():
+            log_file.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(log_file, "w", encoding="utf-8") as f:
+            if self.num_dropped:
+                f.write(f"({self.num_dropped} older messages were dropped)\n")
+            for timestamp, level, msg, exc in self.records:
+                time_str = time.strftime("%H:%M:%S", time.localtime(timestamp))
+                f.write(f"{time_str} {logging.getLevelName(level)} {msg}\n")
+                if exc is not None:
+                    f.write(
+                        "".join(
+                            traceback.format_exception(type(exc), exc, exc.__traceback__)
+                        )
+                    )
+
+        self.records.clear()
+        self.num_dropped = 0
+        return log_file
+
+
+class _PartyReporter(Reporter):
+    # prefixes the messages of a party with its class name
+    def __init__(self, reporter: Reporter, name: str):
+        self.reporter = reporter
+        self.name = name
+
+    def log(self, level: int, msg: str, exc: Optional[BaseException] = None):
+        self.reporter.log(level, f"{self.name}: {msg}", exc)
+
+
+@contextmanager
+def report_parties_to(reporter: Reporter):
+    """Let the parties log to the reporter while in this context, instead of to their
+    own reporter. Parties obtain their reporter with `getReporter`, which is patched on
+    `DefaultParty`, so this works for parties that are instantiated by the geniusweb
+    runner as well.
+
+    Args:
+        reporter (Reporter): reporter to log to, nothing is changed if None
+    """
+    if reporter is None:
+        yield
+        return
+
+    own_method = DefaultParty.__dict__.get("getReporter")
+    DefaultParty.getReporter = lambda party: _PartyReporter(
+        reporter, type(party).__name__
+    )
+    try:
+        yield
+    finally:
+        if own_method is None:
+            del DefaultParty.getReporter
+        else:
+            DefaultParty.getReporter = own_method
@@ -0,0 +1,102 @@
+import time
+from statistics import median
+
+# number of agent pairs of which a session runs alone at the start, as baseline
+BASELINE_PAIRS = 8
+
+
+class ConcurrencyController:
+    """Chooses the number of concurrent sessions based on the health of finished
+    sessions: the rounds per second an agent pair achieved, relative to the rounds per
+    second of that pair in a serial baseline session. Pairs without a baseline session
+    are compared to the baselines of pairs that share an agent with them, or to the
+    baselines of all pairs, so every finished session is taken into account.
+
+    The concurrency is adapted with additive increase / multiplicative decrease: it is
+    raised by one while the median health of the last sessions is above `min_health`
+    and multiplied by `decrease_factor` as soon as it drops below. Every decision is
+    logged with a timestamp in `history`.
+    """
+
+    def __init__(
+        self,
+        floor: int,
+        ceiling: int,
+        min_health: float = 0.9,
+        decrease_factor: float = 0.5,
+    ):
+        assert 1 <= floor <= ceiling
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_health = min_health
+        self.decrease_factor = decrease_factor
+
+        self.concurrency = floor
+        self.baseline = {}
+        self.history = []
+        self._healths = []
+        self._start_time = time.time()
+
+    def set_baseline(self, settings: dict, num_rounds: int, elapsed_s: float):
+        if num_rounds > 0:
+            self.baseline[agent_pair(settings)] = num_rounds / elapsed_s
+
+    def get_baseline(self, settings: dict) -> float:
+        """Rounds per second of the agent pair of a session in the serial baseline, None
+        if there is no baseline at all.
+        """
+        pair = agent_pair(settings)
+        if pair in self.baseline:
+            return self.baseline[pair]
+        agent_baselines = [
+            rate
+            for other_pair, rate in self.baseline.items()
+            if set(other_pair) & set(pair)
+        ]
+        if agent_baselines:
+            return median(agent_baselines)
+        if self.baseline:
+            return median(self.baseline.values())
+        return None
+
+    def update(self, settings: dict, num_rounds: int, elapsed_s: float) -> int:
+        """Add the result of a finished session and return the new concurrency.
+
+        Args:
+            settings (dict): session settings
+            num_rounds (int): number of rounds the session achieved
+            elapsed_s (float): wall-clock time of the session
+
+        Returns:
+            int: number of sessions to run concurrently
+        """
+        baseline = self.get_baseline(settings)
+        if not baseline:
+            return self.concurrency
+        self._healths.append(num_rounds / elapsed_s / baseline)
+
+        # decide once per "generation" of sessions that ran at the current concurrency
+        if len(self._healths) < self.concurrency:
+            return self.concurrency
+        health = median(self._healths)
+        self._healths = []
+
+        if health >= self.min_health:
+            concurrency = min(self.concurrency + 1, self.ceiling)
+        else:
+            concurrency = max(int(self.concurrency * self.decrease_factor), self.floor)
+
+        self.history.append(
+            {
+                "time_s": round(time.time() - self._start_time, 3),
+                "health": health,
+                "concurrency": concurrency,
+            }
+        )
+        self.concurrency = concurrency
+        return concurrency
+
+
+def agent_pair(settings: dict) -> tuple:
+    # the baseline of a pair of agents is shared by both sides of the profile set
+    return tuple(sorted(agent["class"] for agent in settings["agents"]))
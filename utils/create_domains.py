@@ -1,8 +1,11 @@
+import argparse
 import json
 import math
 import os
+import random
 from itertools import product
 from math import sqrt
+from multiprocessing import Pool
 from random import randint
 from shutil import rmtree
 from string import ascii_uppercase
@@ -11,16 +14,206 @@ from typing import Iterable
 import numpy as np
 import plotly.graph_objects as go
 from numpy.random import dirichlet
+from scipy.spatial import cKDTree
 
 NUM_DOMAINS_TO_GENERATE = 50
 
 
 def main():
-    for i in range(NUM_DOMAINS_TO_GENERATE):
-        domain = Domain.create_random(f"domain{i:03d}")
-        domain.calculate_specials()
-        domain.generate_visualisation()
-        domain.to_file("domains/")
+    parser = argparse.ArgumentParser(description="Generate random negotiation domains")
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=NUM_DOMAINS_TO_GENERATE,
+        help=f"number of domains to generate (default: {NUM_DOMAINS_TO_GENERATE})",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="domains/",
+        help="directory to write the domains to (default: domains/)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="base seed, the seed of every domain is derived from it (default: random)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--min-size",
+        type=int,
+        default=200,
+        help="minimum number of bids of a domain (default: 200)",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=10000,
+        help="maximum number of bids of a domain (default: 10000)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="large domain mode: process the bids in chunks of this size and estimate the distribution from a sample",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=100000,
+        help="number of sampled bids in large domain mode (default: 100000)",
+    )
+    args = parser.parse_args()
+
+    generate_domains(
+        args.count,
+        args.output_dir,
+        args.seed,
+        args.workers,
+        min_size=args.min_size,
+        max_size=args.max_size,
+        chunk_size=args.chunk_size,
+        num_samples=args.samples,
+    )
+
+
+def generate_domains(
+    count: int,
+    output_dir: str,
+    base_seed: int = None,
+    workers: int = None,
+    **domain_kwargs,
+):
+    """Generate domains in a process pool and write a manifest with the seed, size,
+    opposition and distribution of every domain to `<output_dir>/manifest.jsonl` as
+    soon as it is generated. Every domain has its own seed, derived from the base seed
+    and its number, so a single domain can be generated again with `generate_domain`.
+
+    Args:
+        count (int): number of domains to generate
+        output_dir (str): directory to write the domains to
+        base_seed (int, optional): base seed. Defaults to None (random).
+        workers (int, optional): number of worker processes. Defaults to None (number of CPUs).
+        **domain_kwargs: passed on to `generate_domain`
+    """
+    if base_seed is None:
+        base_seed = random.randrange(2**32)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    jobs = [
+        (f"domain{i:03d}", domain_seed(base_seed, i), output_dir, domain_kwargs)
+        for i in range(count)
+    ]
+    manifest_file = os.path.join(output_dir, "manifest.jsonl")
+    with open(manifest_file, "w") as manifest, Pool(workers) as pool:
+        for num_done, entry in enumerate(pool.imap_unordered(_generate_job, jobs), 1):
+            entry["base_seed"] = base_seed
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+            print(f"[{num_done}/{count}] {entry['name']} (size: {entry['size']})")
+
+
+def domain_seed(base_seed: int, domain_nr: int) -> int:
+    return int(np.random.SeedSequence([base_seed, domain_nr]).generate_state(1)[0])
+
+
+def generate_domain(
+    name: str,
+    seed: int,
+    output_dir: str,
+    min_size: int = 200,
+    max_size: int = 10000,
+    chunk_size: int = None,
+    num_samples: int = 100000,
+) -> dict:
+    """Generate a single domain with its specials and visualisation from a seed.
+
+    Args:
+        name (str): name of the domain
+        seed (int): seed of the random generators
+        output_dir (str): directory to write the domain to
+        min_size (int, optional): minimum number of bids. Defaults to 200.
+        max_size (int, optional): maximum number of bids. Defaults to 10000.
+        chunk_size (int, optional): chunk size of large domain mode. Defaults to None (off).
+        num_samples (int, optional): sample size of large domain mode. Defaults to 100000.
+
+    Returns:
+        dict: manifest entry of the domain
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+
+    domain = Domain.create_random(name, min_size, max_size, chunk_size)
+    domain.num_samples = num_samples
+    domain.calculate_specials()
+    domain.generate_visualisation()
+    domain.to_file(output_dir)
+
+    entry = {
+        "name": name,
+        "seed": seed,
+        "size": domain.get_size(),
+        "opposition": domain.opposition,
+        "distribution": domain.distribution,
+    }
+    if domain.distribution_error is not None:
+        entry["distribution_error"] = domain.distribution_error
+    return entry
+
+
+def _generate_job(job: tuple) -> dict:
+    name, seed, output_dir, domain_kwargs = job
+    return generate_domain(name, seed, output_dir, **domain_kwargs)
+
+
+def value_names(num_values: int) -> list:
+    # A, B, ..., Z, AA, AB, ... for issues with many values
+    names = []
+    for i in range(num_values):
+        name = ""
+        i += 1
+        while i > 0:
+            i, remainder = divmod(i - 1, 26)
+            name = ascii_uppercase[remainder] + name
+        names.append(name)
+    return names
+
+
+def pareto_positions(
+    utilities_A: np.ndarray, utilities_B: np.ndarray, bid_nrs: np.ndarray
+) -> np.ndarray:
+    """Positions of the bids on the Pareto front, sorted by utility A. A bid is on the
+    Pareto front if no other bid has a higher or equal utility for both profiles and a
+    higher utility for at least one of them. Of bids with exactly the same utilities,
+    only the one with the lowest bid number is kept.
+
+    The bids are sorted by utility A (descending), utility B (descending) and bid
+    number, so a bid is on the Pareto front if its utility B is higher than that of all
+    bids before it.
+
+    Args:
+        utilities_A (np.ndarray): utility of profile A of the bids
+        utilities_B (np.ndarray): utility of profile B of the bids
+        bid_nrs (np.ndarray): number of the bids in the domain
+
+    Returns:
+        np.ndarray: positions of the Pareto front bids in the arrays
+    """
+    order = np.lexsort((bid_nrs, -utilities_B, -utilities_A))
+    sorted_utilities_B = utilities_B[order]
+    max_utilities_B = np.maximum.accumulate(sorted_utilities_B)
+    on_pareto_front = np.empty(len(order), dtype=bool)
+    on_pareto_front[:1] = True
+    on_pareto_front[1:] = sorted_utilities_B[1:] > max_utilities_B[:-1]
+
+    # the utility A of the Pareto front bids is unique, reverse to sort ascending
+    return order[on_pareto_front][::-1]
 
 
 class Profile:
@@ -103,6 +296,25 @@ class Profile:
             self.issue_weights[i] * self.value_weights[i][v] for i, v in bid.items()
         )
 
+    def get_utilities(self, issues_values: dict, bid_matrix: np.ndarray) -> np.ndarray:
+        """Utilities of many bids at once, equal to `get_utility` of every bid.
+
+        Args:
+            issues_values (dict): values per issue, in the order of the bid matrix columns
+            bid_matrix (np.ndarray): value index per issue (columns) for every bid (rows)
+
+        Returns:
+            np.ndarray: utility of every bid
+        """
+        utilities = np.zeros(len(bid_matrix))
+        # the issue utilities are added in the same order as in get_utility
+        for column, (issue, values) in enumerate(issues_values.items()):
+            value_utilities = np.array(
+                [self.issue_weights[issue] * self.value_weights[issue][v] for v in values]
+            )
+            utilities += value_utilities[bid_matrix[:, column]]
+        return utilities
+
 
 class Domain:
     def __init__(
@@ -117,6 +329,9 @@ class Domain:
         distribution=None,
         opposition=None,
         visualisation=None,
+        distribution_error=None,
+        chunk_size: int = None,
+        num_samples: int = 100000,
     ):
         self.domain = domain
         self.profile_A = profile_A
@@ -128,10 +343,22 @@ class Domain:
         self.distribution = distribution
         self.opposition = opposition
         self.visualisation = visualisation
+        self.distribution_error = distribution_error
+        # large domain mode: the bids are processed in chunks of this size and the
+        # distribution is estimated from a sample of bids
+        self.chunk_size = chunk_size
+        self.num_samples = num_samples
+
+        # bid space as arrays, created when needed
+        self._bid_matrix = None
+        self._utilities = None
+        self._sample_utilities = None
 
     @classmethod
-    def create_random(cls, name):
-        domain_size = randint(200, 10000)
+    def create_random(
+        cls, name, min_size: int = 200, max_size: int = 10000, chunk_size: int = None
+    ):
+        domain_size = randint(min_size, max_size)
 
         while True:
             num_issues = randint(4, 10)
@@ -145,13 +372,13 @@ class Domain:
 
         issuesValues = {}
         for issue, num_values in zip(issues, values_per_issue):
-            values = {"values": [f"value{x}" for x in ascii_uppercase[:num_values]]}
+            values = {"values": [f"value{x}" for x in value_names(num_values)]}
             issuesValues[f"issue{issue}"] = values
 
         domain = {"name": name, "issuesValues": issuesValues}
         profile_A = Profile.create_random(domain, "profileA")
         profile_B = Profile.create_random(domain, "profileB")
-        return cls(domain, profile_A, profile_B)
+        return cls(domain, profile_A, profile_B, chunk_size=chunk_size)
 
     @classmethod
     def from_directory(cls, directory):
@@ -174,6 +401,7 @@ class Domain:
                 pareto_front=specials["pareto_front"],
                 distribution=specials["distribution"],
                 opposition=specials["opposition"],
+                distribution_error=specials.get("distribution_error"),
             )
         else:
             domain = cls(domain, profile_A, profile_B)
@@ -182,8 +410,8 @@ class Domain:
     def calculate_specials(self):
         if self.nash_bid:
             return False
-        self.pareto_front = self.get_pareto(list(self.iter_bids()))
-        self.distribution = self.get_distribution(self.iter_bids())
+        self.pareto_front = self.get_pareto()
+        self.distribution = self.get_distribution()
 
         SW_utility = 0
         nash_utility = 0
@@ -210,15 +438,18 @@ class Domain:
         return True
 
     def generate_visualisation(self):
-        bid_utils = [self.get_utilities(bid) for bid in self.iter_bids()]
-        bid_utils = list(zip(*bid_utils))
+        # large domains are plotted with the sample of bids of the distribution
+        if self.chunk_size is None:
+            utilities_A, utilities_B = self.get_utility_vectors()
+        else:
+            utilities_A, utilities_B = self.get_sample_utilities()
 
         fig = go.Figure()
 
         fig.add_trace(
             go.Scatter(
-                x=bid_utils[0],
-                y=bid_utils[1],
+                x=utilities_A,
+                y=utilities_B,
                 mode="markers",
                 name="bids",
                 marker=dict(size=3),
@@ -266,9 +497,12 @@ class Domain:
         fig.update_xaxes(range=[0, 1], title_text="Utility A")
         fig.update_yaxes(range=[0, 1], title_text="Utility B")
 
+        distribution = f"{self.distribution:.4f}"
+        if self.distribution_error is not None:
+            distribution += f" ± {self.distribution_error:.4f}"
         fig.update_layout(
             title=dict(
-                text=f"{self.get_name()}<br><sub>(size: {len(list(self.iter_bids()))}, opposition: {self.opposition:.4f}, distribution: {self.distribution:.4f})</sub>",
+                text=f"{self.get_name()}<br><sub>(size: {self.get_size()}, opposition: {self.opposition:.4f}, distribution: {distribution})</sub>",
                 x=0.5,
                 xanchor="center",
             )
@@ -288,21 +522,20 @@ class Domain:
         self.profile_B.to_file(parent_path)
 
         if self.nash_bid:
+            specials = {
+                "size": self.get_size(),
+                "opposition": self.opposition,
+                "distribution": self.distribution,
+                "social_welfare": self.SW_bid,
+                "nash": self.nash_bid,
+                "kalai": self.kalai_bid,
+                "pareto_front": self.pareto_front,
+            }
+            # the distribution of large domains is an estimate
+            if self.distribution_error is not None:
+                specials["distribution_error"] = self.distribution_error
             with open(os.path.join(path, "specials.json"), "w") as f:
-                f.write(
-                    json.dumps(
-                        {
-                            "size": len(list(self.iter_bids())),
-                            "opposition": self.opposition,
-                            "distribution": self.distribution,
-                            "social_welfare": self.SW_bid,
-                            "nash": self.nash_bid,
-                            "kalai": self.kalai_bid,
-                            "pareto_front": self.pareto_front,
-                        },
-                        indent=2,
-                    )
-                )
+                f.write(json.dumps(specials, indent=2))
 
         if self.visualisation:
             self.visualisation.write_image(
@@ -315,65 +548,167 @@ class Domain:
     def get_utilities(self, bid):
         return self.profile_A.get_utility(bid), self.profile_B.get_utility(bid)
 
-    def get_pareto(self, all_bids: list):
-        pareto_front = []
-        # dominated_bids = set()
-        while True:
-            candidate_bid = all_bids.pop(0)
-            bid_nr = 0
-            dominated = False
-            while len(all_bids) != 0 and bid_nr < len(all_bids):
-                bid = all_bids[bid_nr]
-                if self._dominates(candidate_bid, bid):
-                    # If it is dominated remove the bid from all bids
-                    all_bids.pop(bid_nr)
-                    # dominated_bids.add(frozenset(bid.items()))
-                elif self._dominates(bid, candidate_bid):
-                    dominated = True
-                    # dominated_bids.add(frozenset(candidate_bid.items()))
-                    bid_nr += 1
-                else:
-                    bid_nr += 1
-
-            if not dominated:
-                # add the non-dominated bid to the Pareto frontier
-                pareto_front.append(
-                    {
-                        "bid": candidate_bid,
-                        "utility": [
-                            self.profile_A.get_utility(candidate_bid),
-                            self.profile_B.get_utility(candidate_bid),
-                        ],
-                    }
-                )
+    def get_issues_values(self) -> dict:
+        return {i: v["values"] for i, v in self.domain["issuesValues"].items()}
 
-            if len(all_bids) == 0:
-                break
+    def get_num_values(self) -> list:
+        return [len(v) for v in self.get_issues_values().values()]
 
-        pareto_front = sorted(pareto_front, key=lambda d: d["utility"][0])
+    def get_size(self) -> int:
+        return int(np.prod(self.get_num_values()))
 
-        return pareto_front
+    def get_bid_matrix(self, bid_nrs: np.ndarray = None) -> np.ndarray:
+        """Value index per issue (columns) of bids (rows). The bids are numbered in the
+        same order as `iter_bids`, the number of a bid is its mixed-radix code of value
+        indices. The matrix of all bids is created once and cached.
 
-    def get_distribution(self, bids_iter) -> float:
-        min_distance_sum = 0.0
+        Args:
+            bid_nrs (np.ndarray, optional): numbers of the bids. Defaults to None (all bids).
 
-        for i, bid in enumerate(bids_iter):
-            min_distance = self.distance_to_pareto(bid)
-            min_distance_sum += min_distance
+        Returns:
+            np.ndarray: value index matrix
+        """
+        num_values = self.get_num_values()
+        dtype = np.min_scalar_type(max(num_values))
+        if bid_nrs is not None:
+            return np.column_stack(np.unravel_index(bid_nrs, num_values)).astype(dtype)
+
+        if self._bid_matrix is None:
+            self._bid_matrix = (
+                np.indices(num_values, dtype=dtype).reshape(len(num_values), -1).T
+            )
+        return self._bid_matrix
+
+    def get_chunk_utilities(self, bid_nrs: np.ndarray):
+        # utilities of profile A and B of some bids, without the full bid matrix
+        issues_values = self.get_issues_values()
+        bid_matrix = self.get_bid_matrix(bid_nrs)
+        return (
+            self.profile_A.get_utilities(issues_values, bid_matrix),
+            self.profile_B.get_utilities(issues_values, bid_matrix),
+        )
 
-        distribution = min_distance_sum / (i + 1)
+    def iter_chunks(self) -> Iterable:
+        """Numbers of the bids in chunks of `chunk_size` bids."""
+        size = self.get_size()
+        for start in range(0, size, self.chunk_size):
+            yield np.arange(start, min(start + self.chunk_size, size))
 
-        return distribution
+    def get_sample_utilities(self):
+        """Utilities of profile A and B of a uniform random sample (with replacement)
+        of `num_samples` bids. The sample is drawn once and cached.
+        """
+        if self._sample_utilities is None:
+            bid_nrs = np.random.randint(0, self.get_size(), self.num_samples)
+            self._sample_utilities = self.get_chunk_utilities(bid_nrs)
+        return self._sample_utilities
+
+    def get_utility_vectors(self):
+        """Utilities of profile A and B of all bids, in the same order as `iter_bids`.
+        The utilities are calculated once and cached.
+        """
+        if self._utilities is None:
+            issues_values = self.get_issues_values()
+            bid_matrix = self.get_bid_matrix()
+            self._utilities = (
+                self.profile_A.get_utilities(issues_values, bid_matrix),
+                self.profile_B.get_utilities(issues_values, bid_matrix),
+            )
+        return self._utilities
+
+    def get_bid(self, bid_nr: int) -> dict:
+        # dict bid of a row of the bid matrix
+        value_nrs = np.unravel_index(bid_nr, self.get_num_values())
+        return {
+            issue: values[value_nr]
+            for (issue, values), value_nr in zip(
+                self.get_issues_values().items(), value_nrs
+            )
+        }
 
-    def _dominates(self, bid, candidate_bid):
-        if self.profile_A.get_utility(bid) < self.profile_A.get_utility(candidate_bid):
-            return False
-        elif self.profile_B.get_utility(bid) < self.profile_B.get_utility(
-            candidate_bid
-        ):
-            return False
+    def get_pareto(self):
+        """Pareto front of the bids, sorted by the utility of profile A (see
+        `pareto_positions`). In large domain mode, the Pareto front of every chunk of
+        bids is merged with the Pareto front of the bids before it.
+
+        Returns:
+            list: Pareto front bids with their utilities
+        """
+        if self.chunk_size is None:
+            utilities_A, utilities_B = self.get_utility_vectors()
+            bid_nrs = np.arange(len(utilities_A))
+            positions = pareto_positions(utilities_A, utilities_B, bid_nrs)
+            utilities_A, utilities_B = utilities_A[positions], utilities_B[positions]
+            bid_nrs = bid_nrs[positions]
         else:
-            return True
+            utilities_A, utilities_B = np.empty(0), np.empty(0)
+            bid_nrs = np.empty(0, dtype=np.int64)
+            for chunk_bid_nrs in self.iter_chunks():
+                chunk_utilities_A, chunk_utilities_B = self.get_chunk_utilities(
+                    chunk_bid_nrs
+                )
+                utilities_A = np.concatenate((utilities_A, chunk_utilities_A))
+                utilities_B = np.concatenate((utilities_B, chunk_utilities_B))
+                bid_nrs = np.concatenate((bid_nrs, chunk_bid_nrs))
+
+                positions = pareto_positions(utilities_A, utilities_B, bid_nrs)
+                utilities_A, utilities_B = utilities_A[positions], utilities_B[positions]
+                bid_nrs = bid_nrs[positions]
+
+        pareto_front = [
+            {
+                "bid": self.get_bid(bid_nr),
+                "utility": [float(utility_A), float(utility_B)],
+            }
+            for bid_nr, utility_A, utility_B in zip(bid_nrs, utilities_A, utilities_B)
+        ]
+
+        return pareto_front
+
+    def get_distribution(self, chunk_size: int = 2**16) -> float:
+        """Average distance in terms of utility between the bids and the nearest bid on
+        the Pareto front. The nearest Pareto front bids are found with a KD-tree, for a
+        chunk of bids at a time.
+
+        In large domain mode, the distribution is estimated from a sample of bids and
+        the half-width of its 95% confidence interval is set as `distribution_error`.
+
+        Args:
+            chunk_size (int, optional): number of bids per query. Defaults to 2**16.
+
+        Returns:
+            float: average distance to the Pareto front
+        """
+        if not self.pareto_front:
+            raise ValueError("Pareto front not calculated")
+
+        pareto_tree = cKDTree([element["utility"] for element in self.pareto_front])
+
+        if self.chunk_size is not None:
+            utilities_A, utilities_B = self.get_sample_utilities()
+            min_distances, _ = pareto_tree.query(
+                np.column_stack((utilities_A, utilities_B))
+            )
+            self.distribution_error = float(
+                1.96 * np.std(min_distances, ddof=1) / sqrt(len(min_distances))
+            )
+            return float(np.mean(min_distances))
+
+        utilities_A, utilities_B = self.get_utility_vectors()
+
+        min_distance_sum = 0.0
+        for start in range(0, len(utilities_A), chunk_size):
+            end = start + chunk_size
+            bid_utilities = np.column_stack(
+                (utilities_A[start:end], utilities_B[start:end])
+            )
+            min_distances, _ = pareto_tree.query(bid_utilities)
+            # summed in bid order, like the distances of single bids
+            min_distance_sum = sum(min_distances.tolist(), min_distance_sum)
+
+        distribution = min_distance_sum / len(utilities_A)
+
+        return distribution
 
     def distance_to_pareto(self, bid):
         if not self.pareto_front:
@@ -0,0 +1,317 @@
+import cProfile
+import importlib
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial, wraps
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+from geniusweb.inform.Settings import Settings
+
+
+class PartyMonitor:
+    """Instrumentation of the `notifyChange` callbacks of the parties in a session,
+    see `monitor_parties`.
+    """
+
+    def notify(self, party_id: str, info, notify_change: Callable):
+        """Called instead of the `notifyChange` of a party.
+
+        Args:
+            party_id (str): id of the party (None if the party did not receive its settings yet)
+            info (Inform): inform that is delivered to the party
+            notify_change (Callable): delivers the inform to the party, must be called
+        """
+        return notify_change()
+
+    def finish(self) -> dict:
+        """Called when the session has ended.
+
+        Returns:
+            dict: entries to add to the results summary of the session
+        """
+        return {}
+
+
+class LatencyMonitor(PartyMonitor):
+    """Measures how long the parties take to handle every type of inform."""
+
+    def __init__(self):
+        self.latencies = defaultdict(lambda: defaultdict(list))
+
+    def notify(self, party_id: str, info, notify_change: Callable):
+        start_time = time.perf_counter()
+        try:
+            return notify_change()
+        finally:
+            latency = time.perf_counter() - start_time
+            self.latencies[party_id][type(info).__name__].append(latency)
+
+    def finish(self) -> dict:
+        """Initialisation time (Settings), turn time percentiles (YourTurn) and
+        termination time (Finished) per party in milliseconds, with the same position
+        suffix as the utility of the party in the results summary.
+        """
+        summary = {}
+        for party_id, latencies in self.latencies.items():
+            if party_id is None:
+                continue
+            position = party_id.split("_")[-1]
+            summary[f"settings_ms_{position}"] = sum(latencies["Settings"]) * 1000
+            if latencies["YourTurn"]:
+                turn_ms = np.array(latencies["YourTurn"]) * 1000
+                p50, p95, p99 = np.percentile(turn_ms, [50, 95, 99])
+                summary[f"turn_p50_ms_{position}"] = float(p50)
+                summary[f"turn_p95_ms_{position}"] = float(p95)
+                summary[f"turn_p99_ms_{position}"] = float(p99)
+                summary[f"turn_max_ms_{position}"] = float(turn_ms.max())
+            summary[f"finished_ms_{position}"] = sum(latencies["Finished"]) * 1000
+
+        return summary
+
+
+class CallbackTimeMonitor(PartyMonitor):
+    """Measures the total time spent in the callbacks of all parties, to separate the
+    time of the agents from the time of the protocol in a session. Callbacks that run
+    inside another callback are not counted twice.
+    """
+
+    def __init__(self):
+        self.total_s = 0.0
+        self._local = threading.local()
+
+    def notify(self, party_id: str, info, notify_change: Callable):
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        start_time = time.perf_counter()
+        try:
+            return notify_change()
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self.total_s += time.perf_counter() - start_time
+
+    def finish(self) -> dict:
+        return {"phase_agents_ms": self.total_s * 1000}
+
+
+class MemoryMonitor(PartyMonitor):
+    """Measures the memory the parties allocate with tracemalloc: the peak of the
+    memory allocated during a callback and the memory that remains allocated after the
+    callbacks (e.g. growing histories). The resident set size of the process is
+    sampled after every callback.
+
+    Tracing is process wide, so the callbacks of other parties that run inside a
+    callback (e.g. when a party receives an inform while sending an action) are
+    excluded from the retained memory, but included in the peak.
+    """
+
+    def __init__(self):
+        self.peaks = defaultdict(int)
+        self.retained = defaultdict(int)
+        self.rss_mb = process_rss_mb()
+        # [start, peak, retained by nested callbacks] of the running callbacks
+        self._calls = []
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def notify(self, party_id: str, info, notify_change: Callable):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._calls:
+            self._calls[-1][1] = max(self._calls[-1][1], peak)
+        tracemalloc.reset_peak()
+        call = [current, current, 0]
+        self._calls.append(call)
+        try:
+            return notify_change()
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self._calls.pop()
+            start, call_peak, nested_retained = call
+            self.peaks[party_id] = max(self.peaks[party_id], max(call_peak, peak) - start)
+            self.retained[party_id] += current - start - nested_retained
+            if self._calls:
+                # the peak of this callback is part of the peak of the enclosing one
+                self._calls[-1][1] = max(self._calls[-1][1], call_peak, peak)
+                self._calls[-1][2] += current - start
+            tracemalloc.reset_peak()
+
+            rss_mb = process_rss_mb()
+            if rss_mb is not None:
+                self.rss_mb = max(self.rss_mb, rss_mb)
+
+    def finish(self) -> dict:
+        """Largest allocation peak of a callback and total retained memory per party in
+        megabytes (with the same position suffix as the utility of the party) and the
+        largest sampled resident set size of the process.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        summary = {}
+        for party_id in self.peaks:
+            if party_id is None:
+                continue
+            position = party_id.split("_")[-1]
+            summary[f"mem_peak_mb_{position}"] = self.peaks[party_id] / 2**20
+            summary[f"mem_retained_mb_{position}"] = self.retained[party_id] / 2**20
+        if self.rss_mb is not None:
+            summary["rss_mb"] = self.rss_mb
+
+        return summary
+
+
+class ProfileMonitor(PartyMonitor):
+    """Profiles the callbacks of every party with cProfile. When the session has ended,
+    the profile of every party is saved as `<profile_dir>/<agent class>/<id>.pstats`.
+    """
+
+    def __init__(self, profile_dir):
+        self.profile_dir = Path(profile_dir)
+        self.profilers = {}
+        # profilers of callbacks that are running in this thread, only the innermost
+        # one is enabled (e.g. when a party receives an inform while sending an action)
+        self._local = threading.local()
+
+    def notify(self, party_id: str, info, notify_change: Callable):
+        profiler = self.profilers.setdefault(party_id, cProfile.Profile())
+        stack = self._local.__dict__.setdefault("stack", [])
+        if stack:
+            stack[-1].disable()
+        stack.append(profiler)
+        profiler.enable()
+        try:
+            return notify_change()
+        finally:
+            profiler.disable()
+            stack.pop()
+            if stack:
+                stack[-1].enable()
+
+    def finish(self) -> dict:
+        session_id = uuid.uuid4().hex[:12]
+        for party_id, profiler in self.profilers.items():
+            if party_id is None:
+                continue
+            agent_class, position = party_id.rsplit("_", 1)
+            agent_dir = self.profile_dir.joinpath(agent_class)
+            if not agent_dir.exists():
+                agent_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(agent_dir.joinpath(f"{session_id}_{position}.pstats"))
+
+        return {}
+
+
+def write_profile_report(profile_dir, num_functions: int = 25) -> Path:
+    """Merge the profiles saved by `ProfileMonitor` per agent class and write a report
+    with the functions that take the most time per agent class.
+
+    Args:
+        profile_dir (str | Path): directory with the profiles
+        num_functions (int, optional): number of functions to list per agent class. Defaults to 25.
+
+    Returns:
+        Path: path of the report, None if no profiles were saved
+    """
+    profile_dir = Path(profile_dir)
+    # e.g. all sessions failed or were run by remote workers
+    if not profile_dir.is_dir():
+        return None
+    report_file = profile_dir.joinpath("profile_report.txt")
+    with open(report_file, "w", encoding="utf-8") as f:
+        for agent_dir in sorted(d for d in profile_dir.iterdir() if d.is_dir()):
+            profile_files = sorted(agent_dir.glob("*.pstats"))
+            if not profile_files:
+                continue
+            stats = pstats.Stats(*map(str, profile_files), stream=f)
+            stats.dump_stats(profile_dir.joinpath(f"{agent_dir.name}.pstats"))
+
+            f.write(f"{'=' * 80}\n{agent_dir.name} ({len(profile_files)} profiles)\n")
+            f.write(f"{'=' * 80}\n\nBy cumulative time:\n")
+            stats.sort_stats("cumulative").print_stats(num_functions)
+            f.write("By internal time:\n")
+            stats.sort_stats("tottime").print_stats(num_functions)
+
+    return report_file
+
+
+def process_rss_mb() -> float:
+    """Resident set size of this process in megabytes, None if it is not available
+    (only supported on Linux).
+    """
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@contextmanager
+def monitor_parties(agent_classes: List[str], monitors: List[PartyMonitor]):
+    """Route the `notifyChange` calls of all instances of the agent classes through the
+    monitors while in this context. The classes are patched, so this works for parties
+    that are instantiated by the geniusweb runner as well.
+
+    Args:
+        agent_classes (List[str]): class paths of the agents
+        monitors (List[PartyMonitor]): monitors, the first one is the innermost
+    """
+    if not monitors:
+        yield
+        return
+
+    classes = []
+    for agent_class in agent_classes:
+        module_name, class_name = agent_class.rsplit(".", 1)
+        cls = getattr(importlib.import_module(module_name), class_name)
+        if cls not in classes:
+            classes.append(cls)
+
+    party_ids = {}
+    # parties that are inside a monitored call, calls to notifyChange of a base class
+    # (through super()) are not monitored again
+    active_parties = set()
+
+    def monitored(original):
+        @wraps(original)
+        def notifyChange(party, info):
+            if id(party) in active_parties:
+                return original(party, info)
+            if isinstance(info, Settings):
+                party_ids[id(party)] = str(info.getID())
+            party_id = party_ids.get(id(party))
+
+            call = partial(original, party, info)
+            for monitor in monitors:
+                call = partial(monitor.notify, party_id, info, call)
+
+            active_parties.add(id(party))
+            try:
+                return call()
+            finally:
+                active_parties.discard(id(party))
+
+        return notifyChange
+
+    # look up all original methods before patching, a class can inherit from another one
+    originals = {cls: cls.notifyChange for cls in classes}
+    own_methods = {cls: cls.__dict__.get("notifyChange") for cls in classes}
+    for cls in classes:
+        cls.notifyChange = monitored(originals[cls])
+    try:
+        yield
+    finally:
+        for cls in classes:
+            if own_methods[cls] is None:
+                del cls.notifyChange
+            else:
+                cls.notifyChange = own_methods[cls]
@@ -1,10 +1,17 @@
 import os
 from collections import defaultdict
+from pathlib import Path
 
 import plotly.graph_objects as go
 
+from utils.trace_format import load_trace
+
 
 def plot_trace(results_trace: dict, plot_file: str):
+    # a path to a saved trace (.json or .npz) can be passed as well
+    if isinstance(results_trace, (str, Path)):
+        results_trace = load_trace(results_trace)
+
     utilities = defaultdict(lambda: defaultdict(lambda: {"x": [], "y": [], "bids": []}))
     accept = {"x": [], "y": [], "bids": []}
     for index, action in enumerate(results_trace["actions"], 1):
@@ -0,0 +1,208 @@
+import ast
+import hashlib
+import importlib
+import inspect
+import json
+import shutil
+from functools import lru_cache
+from pathlib import Path
+
+# files in agent directories that do not influence the behaviour of the agent
+IGNORED_FILES = {"__pycache__", ".DS_Store"}
+IGNORED_SUFFIXES = {".pyc", ".pdf"}
+
+
+# root of the repository, only modules in here are part of the agents' source
+REPO_DIR = Path(__file__).resolve().parents[1]
+
+
+@lru_cache(maxsize=None)
+def agent_source_hash(agent_class: str) -> str:
+    """Hash of the source code of an agent. This includes all files in the
+    directories of the modules of the agent class and its base classes that are part
+    of this repository (e.g. `agents/boulware_agent` and `agents/time_dependent_agent`
+    for the BoulwareAgent), and all modules of this repository that the agent imports,
+    directly or through other modules (e.g. `agents/template_agent/utils/opponent_model.py`).
+
+    Args:
+        agent_class (str): class path of the agent
+
+    Returns:
+        str: hexadecimal hash of the agent's source files
+    """
+    module_name, class_name = agent_class.rsplit(".", 1)
+    agent_cls = getattr(importlib.import_module(module_name), class_name)
+
+    source_dirs = set()
+    agent_file = Path(inspect.getfile(agent_cls)).resolve()
+    source_files = {agent_file}
+    for cls in inspect.getmro(agent_cls):
+        try:
+            source_file = Path(inspect.getfile(cls)).resolve()
+        except TypeError:
+            # built-in classes have no source file
+            continue
+        if REPO_DIR in source_file.parents:
+            source_dirs.add(source_file.parent)
+
+    for source_dir in source_dirs:
+        source_files.update(
+            f
+            for f in source_dir.rglob("*")
+            if f.is_file()
+            and not IGNORED_FILES.intersection(f.parts)
+            and f.suffix not in IGNORED_SUFFIXES
+        )
+    if REPO_DIR in agent_file.parents:
+        source_files.update(imported_repo_files(agent_file, agent_cls.__module__))
+
+    source_hash = hashlib.sha1()
+    for source_file in sorted(source_files):
+        source_hash.update(source_file.name.encode("utf-8"))
+        source_hash.update(file_hash(source_file).encode("utf-8"))
+
+    return source_hash.hexdigest()
+
+
+def imported_repo_files(module_file: Path, module_name: str) -> set:
+    """Files of the modules of this repository that a module imports, directly or
+    through other modules of this repository. The imports are read from the source
+    code, so the result does not depend on which modules were imported before.
+
+    Args:
+        module_file (Path): source file of the module
+        module_name (str): full name of the module
+
+    Returns:
+        set: paths of the imported source files, including `module_file`
+    """
+    files = set()
+    pending = [(module_file, module_name)]
+    while pending:
+        module_file, module_name = pending.pop()
+        if module_file in files:
+            continue
+        files.add(module_file)
+
+        if module_file.name == "__init__.py":
+            package = module_name
+        else:
+            package = module_name.rpartition(".")[0]
+        for imported_name in _imported_names(module_file, package):
+            imported_file = _repo_module_file(imported_name)
+            if imported_file is not None:
+                pending.append((imported_file, imported_name))
+
+    return files
+
+
+@lru_cache(maxsize=None)
+def _imported_names(module_file: Path, package: str) -> tuple:
+    # names of all modules (and their parent packages) an import statement can load
+    with open(module_file, "rb") as f:
+        tree = ast.parse(f.read(), filename=str(module_file))
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                package_parts = package.split(".")
+                base = ".".join(package_parts[: len(package_parts) - node.level + 1])
+                base = f"{base}.{node.module}" if node.module else base
+            else:
+                base = node.module
+            names.add(base)
+            # the imported names can be submodules
+            names.update(f"{base}.{alias.name}" for alias in node.names)
+
+    for name in list(names):
+        parts = name.split(".")
+        names.update(".".join(parts[:i]) for i in range(1, len(parts)))
+    return tuple(sorted(name for name in names if name))
+
+
+def _repo_module_file(module_name: str) -> Path:
+    module_path = REPO_DIR.joinpath(*module_name.split("."))
+    for module_file in (
+        module_path.parent.joinpath(f"{module_path.name}.py"),
+        module_path.joinpath("__init__.py"),
+    ):
+        if module_file.is_file():
+            return module_file
+    return None
+
+
+@lru_cache(maxsize=None)
+def file_hash(file) -> str:
+    with open(file, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def session_cache_key(settings: dict) -> str:
+    """Content-based identifier of a negotiation session. Changes when the source
+    code or parameters of one of the agents, the content of the profiles or any other
+    session setting (e.g. deadline, repetition index) changes. Output locations of
+    session settings are left out, they differ per tournament.
+
+    Args:
+        settings (dict): session settings as passed to `run_session`
+
+    Returns:
+        str: hexadecimal hash of the session contents
+    """
+    key_data = {k: v for k, v in settings.items() if k not in ("agents", "profiles")}
+    # where the profiles and session logs are written to does not change the session
+    key_data.pop("profile_agents", None)
+    if isinstance(key_data.get("buffered_logs"), dict):
+        key_data["buffered_logs"] = {
+            k: v for k, v in key_data["buffered_logs"].items() if k != "log_dir"
+        }
+    key_data["agents"] = [
+        {
+            "class": agent["class"],
+            "parameters": agent.get("parameters", {}),
+            "source": agent_source_hash(agent["class"]),
+        }
+        for agent in settings["agents"]
+    ]
+    key_data["profiles"] = [file_hash(profile) for profile in settings["profiles"]]
+
+    key_json = json.dumps(key_data, sort_keys=True)
+    return hashlib.sha1(key_json.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed cache of session result summaries (and optionally traces),
+    so that sessions of unchanged agents on unchanged profiles are not run again.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+
+    def get(self, key: str) -> dict:
+        summary_file = self._path(key).with_suffix(".json")
+        if not summary_file.exists():
+            return None
+        with open(summary_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, key: str, results_summary: dict, trace_file: Path = None):
+        path = self._path(key)
+        if not path.parent.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        if trace_file:
+            trace_suffix = f".trace{Path(trace_file).suffix}"
+            shutil.copyfile(trace_file, path.with_suffix(trace_suffix))
+        # the summary is written last, it marks the cache entry as complete
+        with open(path.with_suffix(".json"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(results_summary))
+
+    def get_trace(self, key: str, trace_format: str) -> Path:
+        trace_file = self._path(key).with_suffix(f".trace.{trace_format}")
+        return trace_file if trace_file.exists() else None
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir.joinpath(key[:2], key)
@@ -1,11 +1,22 @@
+import importlib
+import inspect
+import logging
+import os
 import shutil
-from collections import defaultdict
+import time
+import uuid
+import warnings
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
 from itertools import permutations
-from math import factorial, prod
+from math import ceil, factorial, prod
 from pathlib import Path
 from typing import Tuple
 
 import pandas as pd
+from geniusweb.actions.Accept import Accept
+from geniusweb.actions.Offer import Offer
 from geniusweb.profile.utilityspace.LinearAdditiveUtilitySpace import (
     LinearAdditiveUtilitySpace,
 )
@@ -21,29 +32,144 @@ from pyson.ObjectMapper import ObjectMapper
 from uri.uri import URI
 
 from utils.ask_proceed import ask_proceed
+from utils.buffered_reporter import BufferedReporter, report_parties_to
+from utils.party_monitors import (
+    CallbackTimeMonitor,
+    LatencyMonitor,
+    MemoryMonitor,
+    ProfileMonitor,
+    monitor_parties,
+    write_profile_report,
+)
+from utils.saop_engine import SAOPSession
+from utils.trace_utilities import UtilityArrays, bid_utilities
+
+# session engines: the geniusweb runner or the in-process SAOP engine of utils.saop_engine
+ENGINES = ("geniusweb", "fast")
+
+# optional session settings that are passed on from the tournament settings to every session
+SESSION_OPTIONS = (
+    "deadline_rounds",
+    "engine",
+    "measure_latency",
+    "measure_memory",
+    "measure_phases",
+    "profile_agents",
+    "buffered_logs",
+)
+
+# per party metrics of instrumented sessions that are averaged per agent class
+PARTY_METRICS = (
+    "settings_ms",
+    "turn_p50_ms",
+    "turn_p95_ms",
+    "turn_p99_ms",
+    "turn_max_ms",
+    "finished_ms",
+    "mem_peak_mb",
+    "mem_retained_mb",
+)
+# metrics of an instrumented session, counted for both agents in the session
+SESSION_METRICS = ("rss_mb",)
+
+# phases of a session in order, the agents and reporter phases are part of the negotiation
+SESSION_PHASES = (
+    "setup",
+    "parse",
+    "runner",
+    "negotiation",
+    "serialize",
+    "annotate",
+    "write",
+)
+NEGOTIATION_PHASES = ("agents", "reporter")
+
+# default directory of the log files of sessions with buffered logs
+SESSION_LOG_DIR = Path("results", "session_logs")
+
+# maximum number of parsed profiles to keep in memory per process
+PROFILE_CACHE_SIZE = 256
+
+_profile_cache = OrderedDict()
+profile_cache_stats = {"hits": 0, "misses": 0}
 
 
 def run_session(settings) -> Tuple[dict, dict]:
+    timer = PhaseTimer()
+    timer.start("setup")
     agents = settings["agents"]
     profiles = settings["profiles"]
     deadline_time_ms = settings["deadline_time_ms"]
+    deadline_rounds = settings.get("deadline_rounds")
 
     # quick and dirty checks
     assert isinstance(agents, list) and len(agents) == 2
     assert isinstance(profiles, list) and len(profiles) == 2
     assert isinstance(deadline_time_ms, int) and deadline_time_ms > 0
+    assert deadline_rounds is None or (
+        isinstance(deadline_rounds, int) and deadline_rounds > 0
+    )
     assert all(["class" in agent for agent in agents])
+    assert settings.get("engine", "geniusweb") in ENGINES
 
-    for agent in agents:
-        if "parameters" in agent:
-            if "storage_dir" in agent["parameters"]:
-                storage_dir = Path(agent["parameters"]["storage_dir"])
-                if not storage_dir.exists():
-                    storage_dir.mkdir(parents=True)
+    # with a round deadline, the time deadline is only a safety limit
+    if deadline_rounds is not None:
+        check_rounds_support(agents)
+        deadline = {
+            "DeadlineRounds": {"rounds": deadline_rounds, "durationms": deadline_time_ms}
+        }
+    else:
+        deadline = {"DeadlineTime": {"durationms": deadline_time_ms}}
+
+    create_storage_dirs(agents)
 
     # file path to uri
     profiles_uri = [f"file:{x}" for x in profiles]
 
+    # optional instrumentation of the callbacks of the parties
+    agent_classes = [agent["class"] for agent in agents]
+    monitors = []
+    # directory to save a cProfile profile of every party to (innermost monitor, so
+    # the other monitors do not show up in the profiles)
+    if settings.get("profile_agents"):
+        monitors.append(ProfileMonitor(settings["profile_agents"]))
+    if settings.get("measure_phases"):
+        monitors.append(CallbackTimeMonitor())
+    if settings.get("measure_latency"):
+        monitors.append(LatencyMonitor())
+    if settings.get("measure_memory"):
+        monitors.append(MemoryMonitor())
+
+    # keep the log messages of the session and the parties in memory instead of
+    # writing them to stdout, they are only written to a log file if needed
+    reporter = None
+    if settings.get("buffered_logs"):
+        log_settings = buffered_log_settings(settings)
+        level = log_settings.get("level", logging.INFO)
+        if isinstance(level, str):
+            level = logging.getLevelName(level)
+        reporter = BufferedReporter(level, log_settings.get("capacity", 1000))
+
+    # the in-process engine skips the geniusweb settings parsing and runner
+    if settings.get("engine", "geniusweb") == "fast":
+        try:
+            session = SAOPSession(agents, profiles_uri, deadline_time_ms, deadline_rounds)
+            timer.start("negotiation")
+            with monitor_parties(agent_classes, monitors), report_parties_to(reporter):
+                session.run()
+            timer.start("annotate")
+            results_trace, results_summary = process_fast_session(session)
+        except Exception as e:
+            flush_session_exception(reporter, settings, e)
+            raise
+        timer.stop()
+        flush_session_logs(reporter, settings, results_trace, results_summary)
+        for monitor in monitors:
+            results_summary.update(monitor.finish())
+        if settings.get("measure_phases"):
+            results_summary.update(timer.summary())
+        return results_trace, results_summary
+
     # create full settings dictionary that geniusweb requires
     settings_full = {
         "SAOPSettings": {
@@ -79,28 +205,205 @@ def run_session(settings) -> Tuple[dict, dict]:
                     }
                 },
             ],
-            # "deadline": {"DeadlineRounds": {"rounds": rounds, "durationms": 60000}},
-            "deadline": {"DeadlineTime": {"durationms": deadline_time_ms}},
+            "deadline": deadline,
         }
     }
 
-    # parse settings dict to settings object
-    settings_obj = ObjectMapper().parse(settings_full, NegoSettings)
+    # sessions that raise still write their buffered log messages
+    try:
+        # parse settings dict to settings object
+        timer.start("parse")
+        settings_obj = ObjectMapper().parse(settings_full, NegoSettings)
+
+        # create the negotiation session runner object
+        timer.start("runner")
+        runner_reporter = reporter if reporter is not None else StdOutReporter()
+        if settings.get("measure_phases"):
+            runner_reporter = TimedReporter(runner_reporter, timer)
+        runner = Runner(settings_obj, ClassPathConnectionFactory(), runner_reporter, 0)
+
+        # run the negotiation session
+        timer.start("negotiation")
+        with monitor_parties(agent_classes, monitors), report_parties_to(reporter):
+            runner.run()
+
+        # get results from the session in class format and dict format
+        timer.start("serialize")
+        results_class: SAOPState = runner.getProtocol().getState()
+        results_dict: dict = ObjectMapper().toJson(results_class)["SAOPState"]
+
+        # add utilities to the results and create a summary
+        timer.start("annotate")
+        results_trace, results_summary = process_results(results_class, results_dict)
+    except Exception as e:
+        flush_session_exception(reporter, settings, e)
+        raise
+    timer.stop()
+    flush_session_logs(reporter, settings, results_trace, results_summary)
+    for monitor in monitors:
+        results_summary.update(monitor.finish())
+    if settings.get("measure_phases"):
+        results_summary.update(timer.summary())
 
-    # create the negotiation session runner object
-    runner = Runner(settings_obj, ClassPathConnectionFactory(), StdOutReporter(), 0)
+    return results_trace, results_summary
 
-    # run the negotiation session
-    runner.run()
 
-    # get results from the session in class format and dict format
-    results_class: SAOPState = runner.getProtocol().getState()
-    results_dict: dict = ObjectMapper().toJson(results_class)["SAOPState"]
+def buffered_log_settings(settings: dict) -> dict:
+    # "buffered_logs" is either True or a dict with the log_dir, level, capacity and flush
+    log_settings = settings.get("buffered_logs")
+    return log_settings if isinstance(log_settings, dict) else {}
+
+
+def flush_session_logs(
+    reporter: BufferedReporter, settings: dict, results_trace: dict, results_summary: dict
+):
+    # the buffered log messages are only written for sessions that ended with an error,
+    # or for all sessions if the flush flag is set
+    if reporter is None:
+        return
+    log_settings = buffered_log_settings(settings)
+    failed = results_summary["result"] == "ERROR" or results_trace.get("error")
+    if results_trace.get("error"):
+        reporter.log(logging.ERROR, f"session error: {results_trace['error']}")
+    if failed or log_settings.get("flush"):
+        results_summary["log_file"] = str(write_session_log(reporter, settings))
+
+
+def flush_session_exception(
+    reporter: BufferedReporter, settings: dict, exception: Exception
+):
+    # the session raised instead of returning results, always write its log messages
+    if reporter is None:
+        return
+    reporter.log(logging.ERROR, f"session raised: {exception!r}", exception)
+    write_session_log(reporter, settings)
+
+
+def write_session_log(reporter: BufferedReporter, settings: dict) -> Path:
+    log_settings = buffered_log_settings(settings)
+    agent_names = "-".join(agent["class"].split(".")[-1] for agent in settings["agents"])
+    log_file = Path(
+        log_settings.get("log_dir", SESSION_LOG_DIR),
+        f"{agent_names}_{uuid.uuid4().hex[:8]}.log",
+    )
+    return reporter.flush(log_file)
+
+
+class PhaseTimer:
+    """Wall-clock time of the phases of a session. `start` ends the running phase, so a
+    session can be timed by starting every phase in turn. Phases that run within
+    another phase (e.g. logging during the negotiation) are timed with `phase`.
+    """
+
+    def __init__(self):
+        self.phases_s = defaultdict(float)
+        self._phase = None
+        self._start_time = None
+
+    def start(self, phase: str):
+        self.stop()
+        self._phase = phase
+        self._start_time = time.perf_counter()
+
+    def stop(self):
+        if self._phase is not None:
+            self.phases_s[self._phase] += time.perf_counter() - self._start_time
+            self._phase = None
+
+    @contextmanager
+    def phase(self, phase: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases_s[phase] += time.perf_counter() - start_time
+
+    def summary(self) -> dict:
+        return {f"phase_{phase}_ms": s * 1000 for phase, s in self.phases_s.items()}
+
+
+class TimedReporter:
+    """Reporter that passes the log messages on to another reporter and times this as
+    the reporter phase of a `PhaseTimer`.
+    """
+
+    def __init__(self, reporter, timer: PhaseTimer):
+        self.reporter = reporter
+        self.timer = timer
+
+    def log(self, *args, **kwargs):
+        with self.timer.phase("reporter"):
+            self.reporter.log(*args, **kwargs)
+
+
+def format_phase_breakdown(phases_ms: dict) -> str:
+    """Share of every phase in the total time of the sessions, the agents and reporter
+    phases as share of the negotiation phase.
+
+    Args:
+        phases_ms (dict): summed `phase_<name>_ms` entries of the session summaries
+
+    Returns:
+        str: one line breakdown
+    """
+    total_ms = sum(phases_ms.get(f"phase_{phase}_ms", 0) for phase in SESSION_PHASES)
+    if total_ms == 0:
+        return "Session phases: no measurements"
+
+    parts = []
+    for phase in SESSION_PHASES:
+        phase_ms = phases_ms.get(f"phase_{phase}_ms")
+        if phase_ms is None:
+            continue
+        part = f"{phase} {phase_ms / total_ms:.1%}"
+        if phase == "negotiation" and phase_ms > 0:
+            sub_parts = [
+                f"{sub_phase} {phases_ms[f'phase_{sub_phase}_ms'] / phase_ms:.1%}"
+                for sub_phase in NEGOTIATION_PHASES
+                if f"phase_{sub_phase}_ms" in phases_ms
+            ]
+            if sub_parts:
+                part += f" ({', '.join(sub_parts)})"
+        parts.append(part)
+
+    return f"Session phases ({total_ms / 1000:.1f} s): {', '.join(parts)}"
+
+
+def create_storage_dirs(agents: list):
+    for agent in agents:
+        if "parameters" in agent:
+            if "storage_dir" in agent["parameters"]:
+                storage_dir = Path(agent["parameters"]["storage_dir"])
+                if not storage_dir.exists():
+                    storage_dir.mkdir(parents=True)
 
-    # add utilities to the results and create a summary
-    results_trace, results_summary = process_results(results_class, results_dict)
 
-    return results_trace, results_summary
+def check_rounds_support(agents: list):
+    """Warn about agents that do not advance their ProgressRounds object. In a session
+    with a round deadline these agents see no progress and will never concede.
+    """
+    unsupported = [a["class"] for a in agents if not uses_progress_rounds(a["class"])]
+    if unsupported:
+        warnings.warn(
+            "Agents do not advance ProgressRounds and will not track the round "
+            f"deadline: {', '.join(unsupported)}"
+        )
+
+
+@lru_cache(maxsize=None)
+def uses_progress_rounds(agent_class: str) -> bool:
+    # static check of the modules of the agent class and its base classes
+    module_name, class_name = agent_class.rsplit(".", 1)
+    agent_cls = getattr(importlib.import_module(module_name), class_name)
+    for cls in inspect.getmro(agent_cls):
+        try:
+            source = inspect.getsource(inspect.getmodule(cls))
+        except (TypeError, OSError):
+            continue
+        if "ProgressRounds" in source and ".advance()" in source:
+            return True
+
+    return False
 
 
 def run_tournament(tournament_settings: dict) -> Tuple[list, list]:
@@ -122,6 +425,8 @@ def run_tournament(tournament_settings: dict) -> Tuple[list, list]:
 
     tournament_results = []
     tournament_steps = []
+    # the profile cache lives as long as the process, count this tournament only
+    profile_cache_start = dict(profile_cache_stats)
     for profiles in profile_sets:
         # quick an dirty check
         assert isinstance(profiles, list) and len(profiles) == 2
@@ -132,6 +437,9 @@ def run_tournament(tournament_settings: dict) -> Tuple[list, list]:
                 "profiles": profiles,
                 "deadline_time_ms": deadline_time_ms,
             }
+            for option in SESSION_OPTIONS:
+                if option in tournament_settings:
+                    settings[option] = tournament_settings[option]
 
             # run a single negotiation session
             _, session_results_summary = run_session(settings)
@@ -142,6 +450,25 @@ def run_tournament(tournament_settings: dict) -> Tuple[list, list]:
 
     tournament_results_summary = process_tournament_results(tournament_results)
 
+    print(
+        f"Profile cache: {profile_cache_stats['hits'] - profile_cache_start['hits']} hits, "
+        f"{profile_cache_stats['misses'] - profile_cache_start['misses']} misses"
+    )
+    if tournament_settings.get("measure_phases"):
+        phases_ms = defaultdict(float)
+        for session_results in tournament_results:
+            for k, v in session_results.items():
+                if k.startswith("phase_"):
+                    phases_ms[k] += v
+        print(format_phase_breakdown(phases_ms))
+
+    if tournament_settings.get("profile_agents"):
+        report_file = write_profile_report(tournament_settings["profile_agents"])
+        if report_file:
+            print(f"Agent profile report: {report_file}")
+        else:
+            print("No agent profiles were saved, skipping the profile report")
+
     return tournament_steps, tournament_results, tournament_results_summary
 
 
@@ -151,44 +478,82 @@ def process_results(results_class: SAOPState, results_dict: dict):
         k: v["party"]["partyref"].split(".")[-1]
         for k, v in results_dict["partyprofiles"].items()
     }
+    profiles = {k: v["profile"] for k, v in results_dict["partyprofiles"].items()}
 
-    results_summary = {"num_offers": 0}
+    results_summary, offers_utilities = summarize_actions(
+        agent_translate,
+        profiles,
+        results_dict["connections"],
+        results_class.getActions(),
+    )
 
-    # check if there are any actions (could have crashed)
-    if results_dict["actions"]:
-        # obtain utility functions
-        utility_funcs = {
-            k: get_utility_function(v["profile"])
-            for k, v in results_dict["partyprofiles"].items()
-        }
+    add_offer_utilities(results_dict["actions"], offers_utilities)
 
-        # iterate both action classes and dict entries
-        actions_iter = zip(results_class.getActions(), results_dict["actions"])
+    return results_dict, results_summary
 
-        for action_class, action_dict in actions_iter:
-            if "Offer" in action_dict:
-                offer = action_dict["Offer"]
-            elif "Accept" in action_dict:
-                offer = action_dict["Accept"]
-            else:
-                continue
 
-            # add bid utility of both agents if bid is not None
-            bid = action_class.getBid()
-            if bid is None:
-                raise ValueError(
-                    f"Found `None` value in sequence of actions: {action_class}"
-                )
-            else:
-                offer["utilities"] = {
-                    k: float(v.getUtility(bid)) for k, v in utility_funcs.items()
-                }
+def process_fast_session(session: SAOPSession) -> Tuple[dict, dict]:
+    # results of a session of the in-process SAOP engine, in the same format as `process_results`
+    results_trace = session.trace()
+    profiles = {k: v["profile"] for k, v in results_trace["partyprofiles"].items()}
+
+    results_summary, offers_utilities = summarize_actions(
+        session.agent_names(),
+        profiles,
+        results_trace["connections"],
+        session.actions,
+    )
+
+    add_offer_utilities(results_trace["actions"], offers_utilities)
+
+    return results_trace, results_summary
+
 
-            results_summary["num_offers"] += 1
+def summarize_actions(
+    agent_names: dict, profiles: dict, connections: list, actions: list
+) -> Tuple[dict, list]:
+    """Summary of the outcome of a negotiation session.
+
+    Args:
+        agent_names (dict): Python class name per party id
+        profiles (dict): profile URI per party id
+        connections (list): party ids in order of their position in the session
+        actions (list): geniusweb actions of the session
+
+    Returns:
+        Tuple[dict, list]: results summary and the utilities of every party for every
+            offer and accept in the actions
+    """
+    results_summary = {"num_offers": 0, "num_rounds": 0}
+    offers_utilities = []
+
+    # check if there are any actions (could have crashed)
+    if actions:
+        # obtain the compiled utility functions
+        utility_funcs = {k: get_utility_arrays(v) for k, v in profiles.items()}
+
+        # collect bids to add the utility of both agents, bid should not be None
+        bids = []
+        for action in actions:
+            if not isinstance(action, (Offer, Accept)):
+                continue
+            bid = action.getBid()
+            if bid is None:
+                raise ValueError(f"Found `None` value in sequence of actions: {action}")
+            bids.append(bid)
+
+        # compute the utilities of all bids in the trace at once
+        bids_utilities = {k: bid_utilities(v, bids) for k, v in utility_funcs.items()}
+        offers_utilities = [
+            {k: float(v[i]) for k, v in bids_utilities.items()} for i in range(len(bids))
+        ]
+        results_summary["num_offers"] = len(bids)
+        # a round ends when every party took a turn
+        results_summary["num_rounds"] = ceil(len(actions) / len(profiles))
 
         # gather a summary of results
-        if "Accept" in action_dict:
-            utilities_final = list(offer["utilities"].values())
+        if isinstance(actions[-1], Accept):
+            utilities_final = list(offers_utilities[-1].values())
             result = "agreement"
         else:
             utilities_final = [0, 0]
@@ -197,84 +562,154 @@ def process_results(results_class: SAOPState, results_dict: dict):
         utilities_final = [0, 0]
         result = "ERROR"
 
-    for i, actor in enumerate(results_dict["connections"]):
+    for i, actor in enumerate(connections):
         position = actor.split("_")[-1]
-        results_summary[f"agent_{position}"] = agent_translate[actor]
+        results_summary[f"agent_{position}"] = agent_names[actor]
         results_summary[f"utility_{position}"] = utilities_final[i]
     results_summary["nash_product"] = prod(utilities_final)
     results_summary["social_welfare"] = sum(utilities_final)
     results_summary["result"] = result
 
-    return results_dict, results_summary
+    return results_summary, offers_utilities
+
+
+def add_offer_utilities(action_dicts: list, offers_utilities: list):
+    # add the utilities of both agents to the offers and accepts in the trace
+    offers = [
+        action_dict.get("Offer", action_dict.get("Accept"))
+        for action_dict in action_dicts
+        if "Offer" in action_dict or "Accept" in action_dict
+    ]
+    for offer, utilities in zip(offers, offers_utilities):
+        offer["utilities"] = utilities
 
 
 def get_utility_function(profile_uri) -> LinearAdditiveUtilitySpace:
+    return _get_cached_profile(profile_uri)[0]
+
+
+def get_utility_arrays(profile_uri) -> UtilityArrays:
+    # the compiled profile is cached with the parsed profile
+    return _get_cached_profile(profile_uri)[1]
+
+
+def _get_cached_profile(profile_uri) -> Tuple[LinearAdditiveUtilitySpace, UtilityArrays]:
+    # parsed profiles are cached, a profile is parsed again if its file was modified
+    profile_file = profile_uri[len("file:") :] if profile_uri.startswith("file:") else None
+    if profile_file and os.path.exists(profile_file):
+        cache_key = (profile_uri, os.path.getmtime(profile_file))
+    else:
+        cache_key = (profile_uri, None)
+
+    if cache_key in _profile_cache:
+        profile_cache_stats["hits"] += 1
+        _profile_cache.move_to_end(cache_key)
+        return _profile_cache[cache_key]
+    profile_cache_stats["misses"] += 1
+
     profile_connection = ProfileConnectionFactory.create(
         URI(profile_uri), StdOutReporter()
     )
     profile = profile_connection.getProfile()
     assert isinstance(profile, LinearAdditiveUtilitySpace)
 
-    return profile
+    _profile_cache[cache_key] = (profile, UtilityArrays(profile))
+    if len(_profile_cache) > PROFILE_CACHE_SIZE:
+        _profile_cache.popitem(last=False)
+
+    return _profile_cache[cache_key]
 
 
 def process_tournament_results(tournament_results):
-    agent_result_raw = defaultdict(lambda: defaultdict(list))
-    tournament_results_summary = defaultdict(lambda: defaultdict(int))
+    tournament_summary = TournamentSummary()
     for session_results in tournament_results:
+        tournament_summary.add(session_results)
+
+    return tournament_summary.to_dataframe()
+
+
+class TournamentSummary:
+    """Running aggregate of session result summaries per agent class. Sessions can be
+    added one at a time, so the summary can be kept up to date during a tournament
+    without holding all session results in memory.
+    """
+
+    def __init__(self):
+        self.agent_result_sums = defaultdict(lambda: defaultdict(float))
+        self.agent_counts = defaultdict(lambda: defaultdict(int))
+        # party metrics are only available for instrumented sessions
+        self.agent_metric_counts = defaultdict(lambda: defaultdict(int))
+
+    def add(self, session_results: dict):
         agents = {k: v for k, v in session_results.items() if k.startswith("agent")}
         for agent_id, agent_class in agents.items():
-            agent_result_raw[agent_class]["utility"].append(
-                session_results[f"utility_{agent_id.split('_')[1]}"]
-            )
-            agent_result_raw[agent_class]["nash_product"].append(
-                session_results["nash_product"]
-            )
-            agent_result_raw[agent_class]["social_welfare"].append(
-                session_results["social_welfare"]
-            )
+            position = agent_id.split("_")[1]
+            result_sums = self.agent_result_sums[agent_class]
+            result_sums["utility"] += session_results[f"utility_{position}"]
+            result_sums["nash_product"] += session_results["nash_product"]
+            result_sums["social_welfare"] += session_results["social_welfare"]
             if "num_offers" in session_results:
-                agent_result_raw[agent_class]["num_offers"].append(
-                    session_results["num_offers"]
-                )
-            tournament_results_summary[agent_class][session_results["result"]] += 1
-
-    for agent, stats in agent_result_raw.items():
-        num_session = len(stats["utility"])
-        for desc, stat in stats.items():
-            stat_average = sum(stat) / num_session
-            tournament_results_summary[agent][f"avg_{desc}"] = stat_average
-        tournament_results_summary[agent]["count"] = num_session
-
-    column_order = [
-        "avg_utility",
-        "avg_nash_product",
-        "avg_social_welfare",
-        "avg_num_offers",
-        "count",
-        "agreement",
-        "failed",
-        "ERROR",
-    ]
-    column_type = {
-        "count": int,
-        "agreement": int,
-        "failed": int,
-        "ERROR": int,
-    }
+                result_sums["num_offers"] += session_results["num_offers"]
+            if "num_rounds" in session_results:
+                result_sums["num_rounds"] += session_results["num_rounds"]
+            self.agent_counts[agent_class]["count"] += 1
+            self.agent_counts[agent_class][session_results["result"]] += 1
+            for metric in PARTY_METRICS:
+                if f"{metric}_{position}" in session_results:
+                    result_sums[metric] += session_results[f"{metric}_{position}"]
+                    self.agent_metric_counts[agent_class][metric] += 1
+            for metric in SESSION_METRICS:
+                if metric in session_results:
+                    result_sums[metric] += session_results[metric]
+                    self.agent_metric_counts[agent_class][metric] += 1
+
+    def to_dataframe(self) -> pd.DataFrame:
+        tournament_results_summary = defaultdict(lambda: defaultdict(int))
+        for agent, stats in self.agent_result_sums.items():
+            num_session = self.agent_counts[agent]["count"]
+            metric_counts = self.agent_metric_counts[agent]
+            for desc, stat in stats.items():
+                stat_average = stat / metric_counts.get(desc, num_session)
+                tournament_results_summary[agent][f"avg_{desc}"] = stat_average
+            tournament_results_summary[agent].update(self.agent_counts[agent])
+
+        column_order = [
+            "avg_utility",
+            "avg_nash_product",
+            "avg_social_welfare",
+            "avg_num_offers",
+            "avg_num_rounds",
+            "count",
+            "agreement",
+            "failed",
+            "ERROR",
+        ]
+        column_order += [
+            f"avg_{metric}"
+            for metric in PARTY_METRICS + SESSION_METRICS
+            if any(metric in counts for counts in self.agent_metric_counts.values())
+        ]
+        column_type = {
+            "count": int,
+            "agreement": int,
+            "failed": int,
+            "ERROR": int,
+        }
 
-    # results dictionary to dataframe
-    tournament_results_summary = pd.DataFrame(tournament_results_summary).T
+        # results dictionary to dataframe
+        tournament_results_summary = pd.DataFrame(tournament_results_summary).T
 
-    # clean data and types
-    tournament_results_summary = tournament_results_summary.fillna(0)
-    for column in column_order:
-        if column not in tournament_results_summary:
-            tournament_results_summary[column] = 0
-    tournament_results_summary = tournament_results_summary.astype(column_type)
+        # clean data and types
+        tournament_results_summary = tournament_results_summary.fillna(0)
+        for column in column_order:
+            if column not in tournament_results_summary:
+                tournament_results_summary[column] = 0
+        tournament_results_summary = tournament_results_summary.astype(column_type)
 
-    # structure dataframe
-    tournament_results_summary.sort_values("avg_utility", ascending=False, inplace=True)
-    tournament_results_summary = tournament_results_summary[column_order]
+        # structure dataframe
+        tournament_results_summary.sort_values(
+            "avg_utility", ascending=False, inplace=True
+        )
+        tournament_results_summary = tournament_results_summary[column_order]
 
-    return tournament_results_summary
+        return tournament_results_summary
@@ -1,284 +1,553 @@
+import importlib
+import json
+import os
 import shutil
-from collections import defaultdict
+import time
+import traceback
 from itertools import permutations
-from math import factorial, prod
 from pathlib import Path
-from typing import Tuple
+from typing import List, Tuple
 
 import pandas as pd
-from geniusweb.profile.utilityspace.LinearAdditiveUtilitySpace import (
-    LinearAdditiveUtilitySpace,
-)
-from geniusweb.profileconnection.ProfileConnectionFactory import (
-    ProfileConnectionFactory,
-)
-from geniusweb.protocol.NegoSettings import NegoSettings
-from geniusweb.protocol.session.saop.SAOPState import SAOPState
-from geniusweb.simplerunner.ClassPathConnectionFactory import ClassPathConnectionFactory
-from geniusweb.simplerunner.NegoRunner import StdOutReporter
-from geniusweb.simplerunner.Runner import Runner
-from pyson.ObjectMapper import ObjectMapper
-from uri.uri import URI
 
 from utils.ask_proceed import ask_proceed
-
-
-def run_session(settings) -> Tuple[dict, dict]:
-    agents = settings["agents"]
-    profiles = settings["profiles"]
-    deadline_time_ms = settings["deadline_time_ms"]
-
-    # quick and dirty checks
-    assert isinstance(agents, list) and len(agents) == 2
-    assert isinstance(profiles, list) and len(profiles) == 2
-    assert isinstance(deadline_time_ms, int) and deadline_time_ms > 0
-    assert all(["class" in agent for agent in agents])
-
-    for agent in agents:
-        if "parameters" in agent:
-            if "storage_dir" in agent["parameters"]:
-                storage_dir = Path(agent["parameters"]["storage_dir"])
-                if not storage_dir.exists():
-                    storage_dir.mkdir(parents=True)
-
-    # file path to uri
-    profiles_uri = [f"file:{x}" for x in profiles]
-
-    # create full settings dictionary that geniusweb requires
-    settings_full = {
-        "SAOPSettings": {
-            "participants": [
-                {
-                    "TeamInfo": {
-                        "parties": [
-                            {
-                                "party": {
-                                    "partyref": f"pythonpath:{agents[0]['class']}",
-                                    "parameters": agents[0]["parameters"]
-                                    if "parameters" in agents[0]
-                                    else {},
-                                },
-                                "profile": profiles_uri[0],
-                            }
-                        ]
-                    }
-                },
-                {
-                    "TeamInfo": {
-                        "parties": [
-                            {
-                                "party": {
-                                    "partyref": f"pythonpath:{agents[1]['class']}",
-                                    "parameters": agents[1]["parameters"]
-                                    if "parameters" in agents[1]
-                                    else {},
-                                },
-                                "profile": profiles_uri[1],
-                            }
-                        ]
-                    }
-                },
-            ],
-            # "deadline": {"DeadlineRounds": {"rounds": rounds, "durationms": 60000}},
-            "deadline": {"DeadlineTime": {"durationms": deadline_time_ms}},
-        }
+from utils import runners
+from utils.concurrency import BASELINE_PAIRS, ConcurrencyController, agent_pair
+from utils.party_monitors import process_rss_mb, write_profile_report
+from utils.result_cache import ResultCache, session_cache_key
+from utils.runners import (
+    SESSION_OPTIONS,
+    TournamentSummary,
+    format_phase_breakdown,
+    run_session,
+)
+from utils.session_costs import SessionCostModel
+from utils.session_journal import SessionJournal, session_key
+from utils.session_multiplexer import run_multiplexed
+from utils.session_pool import SessionPool
+from utils.trace_format import save_trace
+from utils.work_queue import WorkQueueCoordinator, run_worker
+
+
+def run_session_job(job: Tuple[dict, Path, str]) -> dict:
+    settings, trace_file, trace_format = job
+
+    profile_cache_stats = dict(runners.profile_cache_stats)
+    start_time = time.time()
+    session_results_trace, session_results_summary = run_session(settings)
+
+    write_start_time = time.perf_counter()
+    trace_file = save_job_trace(session_results_trace, trace_file, trace_format)
+    if settings.get("measure_phases"):
+        write_ms = (time.perf_counter() - write_start_time) * 1000
+        session_results_summary["phase_write_ms"] = write_ms
+
+    return {
+        "settings": settings,
+        "summary": session_results_summary,
+        "trace_file": trace_file,
+        "elapsed_s": time.time() - start_time,
+        "profile_cache": {
+            k: v - profile_cache_stats[k] for k, v in runners.profile_cache_stats.items()
+        },
+        "worker": {"pid": os.getpid(), "rss_mb": process_rss_mb()},
     }
 
-    # parse settings dict to settings object
-    settings_obj = ObjectMapper().parse(settings_full, NegoSettings)
-
-    # create the negotiation session runner object
-    runner = Runner(settings_obj, ClassPathConnectionFactory(), StdOutReporter(), 0)
 
-    # run the negotiation session
-    runner.run()
+def run_multiplexed_job(jobs: List[Tuple[dict, Path, str]]) -> dict:
+    # a batch of round-based sessions that run concurrently in one worker process
+    profile_cache_stats = dict(runners.profile_cache_stats)
+    sessions_results = run_multiplexed([job[0] for job in jobs])
 
-    # get results from the session in class format and dict format
-    results_class: SAOPState = runner.getProtocol().getState()
-    results_dict: dict = ObjectMapper().toJson(results_class)["SAOPState"]
-
-    # add utilities to the results and create a summary
-    results_trace, results_summary = process_results(results_class, results_dict)
-
-    return results_trace, results_summary
-
-
-from multiprocessing import Pool
-from itertools import permutations
+    sessions = []
+    for (settings, trace_file, trace_format), session_results in zip(
+        jobs, sessions_results
+    ):
+        if isinstance(session_results, Exception):
+            error = "".join(
+                traceback.format_exception(
+                    type(session_results), session_results, session_results.__traceback__
+                )
+            )
+            sessions.append((None, error))
+            continue
+
+        session_results_trace, session_results_summary, elapsed_s = session_results
+        result = {
+            "settings": settings,
+            "summary": session_results_summary,
+            "trace_file": save_job_trace(session_results_trace, trace_file, trace_format),
+            "elapsed_s": elapsed_s,
+        }
+        sessions.append((result, None))
+
+    return {
+        "sessions": sessions,
+        "profile_cache": {
+            k: v - profile_cache_stats[k] for k, v in runners.profile_cache_stats.items()
+        },
+        "worker": {"pid": os.getpid(), "rss_mb": process_rss_mb()},
+    }
 
-def run_session_wrapper(args):
-    return run_session(*args)
 
-def run_tournament(tournament_settings: dict) -> Tuple[list, list]:
+def save_job_trace(results_trace: dict, trace_file: Path, trace_format: str) -> Path:
+    # the (large) trace is written by the worker itself, so that only the small
+    # summary has to be send back to the parent process
+    if not trace_file:
+        return None
+    if not trace_file.parent.exists():
+        trace_file.parent.mkdir(parents=True, exist_ok=True)
+    return save_trace(results_trace, trace_file, trace_format)
+
+
+def run_tournament(
+    tournament_settings: dict,
+    results_dir: Path,
+    resume: bool = False,
+    save_traces: bool = False,
+    trace_format: str = "json",
+    timeout_grace_s: float = 60.0,
+    cost_history_file: Path = Path("results", "session_cost_history.json"),
+    processes: int = None,
+    preload_agents: bool = False,
+    maxtasksperchild: int = None,
+    pin_cpus: bool = False,
+    concurrency_range: Tuple[int, int] = None,
+    baseline_pairs: int = BASELINE_PAIRS,
+    multiplex: int = None,
+    serve_address: Tuple[str, int] = None,
+    authkey: bytes = None,
+    cache_dir: Path = None,
+    force_rerun: bool = False,
+) -> pd.DataFrame:
     # create agent permutations, ensures that every agent plays against every other agent on both sides of a profile set.
     agents = tournament_settings["agents"]
     profile_sets = tournament_settings["profile_sets"]
     deadline_time_ms = tournament_settings["deadline_time_ms"]
-
-    num_sessions = (factorial(len(agents)) // factorial(len(agents) - 2)) * len(profile_sets)
-    if num_sessions > 100:
-        message = f"WARNING: this would run {num_sessions} negotiation sessions. Proceed?"
-        if not ask_proceed(message):
-            print("Exiting script")
-            exit()
-
-    tournament_results = []
-    tournament_steps = []
-    with Pool() as pool:
-        args_list = []
-        for profiles in profile_sets:
-            # quick an dirty check
-            assert isinstance(profiles, list) and len(profiles) == 2
-            for agent_duo in permutations(agents, 2):
+    deadline_rounds = tournament_settings.get("deadline_rounds")
+    engine = tournament_settings.get("engine")
+    repetitions = tournament_settings.get("repetitions", 1)
+
+    tournament_jobs = []
+    for profiles in profile_sets:
+        # quick an dirty check
+        assert isinstance(profiles, list) and len(profiles) == 2
+        for agent_duo in permutations(agents, 2):
+            for repetition in range(repetitions):
                 # create session settings dict
                 settings = {
                     "agents": list(agent_duo),
                     "profiles": profiles,
                     "deadline_time_ms": deadline_time_ms,
+                    "repetition": repetition,
                 }
-                args_list.append((settings,))
-
-        results = pool.map(run_session_wrapper, args_list)
-        for settings, session_results_summary in results:
-            # assemble results
-            tournament_steps.append(settings)
-            tournament_results.append(session_results_summary)
-
-    tournament_results_summary = process_tournament_results(tournament_results)
-
-    return tournament_steps, tournament_results, tournament_results_summary
-
-
-def process_results(results_class: SAOPState, results_dict: dict):
-    # dict to translate geniusweb agent reference to Python class name
-    agent_translate = {
-        k: v["party"]["partyref"].split(".")[-1]
-        for k, v in results_dict["partyprofiles"].items()
-    }
-
-    results_summary = {"num_offers": 0}
-
-    # check if there are any actions (could have crashed)
-    if results_dict["actions"]:
-        # obtain utility functions
-        utility_funcs = {
-            k: get_utility_function(v["profile"])
-            for k, v in results_dict["partyprofiles"].items()
-        }
-
-        # iterate both action classes and dict entries
-        actions_iter = zip(results_class.getActions(), results_dict["actions"])
+                for option in SESSION_OPTIONS:
+                    if option in tournament_settings:
+                        settings[option] = tournament_settings[option]
+                tournament_jobs.append(settings)
+    job_keys = {session_key(settings) for settings in tournament_jobs}
+
+    if deadline_rounds is not None:
+        runners.check_rounds_support(agents)
+
+    if serve_address:
+        if not authkey:
+            raise ValueError("Serving sessions to remote workers requires an authkey")
+        # remote workers write the traces on their own host, the cache cannot copy them
+        if cache_dir and save_traces:
+            raise ValueError(
+                "The result cache cannot store the traces of sessions on remote workers"
+            )
 
-        for action_class, action_dict in actions_iter:
-            if "Offer" in action_dict:
-                offer = action_dict["Offer"]
-            elif "Accept" in action_dict:
-                offer = action_dict["Accept"]
-            else:
-                continue
+    traces_dir = results_dir.joinpath("traces")
+    if save_traces and not traces_dir.exists():
+        traces_dir.mkdir(parents=True)
+
+    journal = SessionJournal(results_dir.joinpath("session_journal.jsonl"))
+    tournament_summary = TournamentSummary()
+    tournament_stats = {"profile_cache": {"hits": 0, "misses": 0}}
+
+    # sessions of unchanged agents on unchanged profiles are taken from the result cache
+    result_cache = ResultCache(cache_dir) if cache_dir else None
+    cache_keys = {}
+
+    # results are written to file as soon as a session finishes, nothing is kept in memory
+    with JsonListWriter(
+        results_dir.joinpath("tournament_steps.json")
+    ) as steps_writer, JsonListWriter(
+        results_dir.joinpath("tournament_results.json")
+    ) as results_writer:
+
+        def add_session(settings, session_results_summary):
+            steps_writer.write(settings)
+            results_writer.write(session_results_summary)
+            tournament_summary.add(session_results_summary)
+
+        # sessions that were already finished in a previous (interrupted) run are skipped
+        finished_keys = set()
+        if resume:
+            for record in journal.records():
+                if record["key"] in job_keys and record["key"] not in finished_keys:
+                    finished_keys.add(record["key"])
+                    add_session(record["settings"], record["summary"])
+            print(f"Resuming tournament: {len(finished_keys)} sessions found in journal")
+
+        pending_jobs, cached_sessions = [], 0
+        with journal:
+            for settings in tournament_jobs:
+                key = session_key(settings)
+                if key in finished_keys:
+                    continue
+                trace_file = traces_dir.joinpath(key) if save_traces else None
+
+                if result_cache:
+                    cache_key = cache_keys[key] = session_cache_key(settings)
+                    cached_summary = None if force_rerun else result_cache.get(cache_key)
+                    cached_trace = result_cache.get_trace(cache_key, trace_format)
+                    # a cached session without the requested trace is run again
+                    if cached_summary is not None and (not save_traces or cached_trace):
+                        if save_traces:
+                            shutil.copyfile(
+                                cached_trace, trace_file.with_suffix(f".{trace_format}")
+                            )
+                        journal.append(key, settings, cached_summary)
+                        add_session(settings, cached_summary)
+                        finished_keys.add(key)
+                        cached_sessions += 1
+                        continue
+
+                pending_jobs.append((settings, trace_file, trace_format))
+
+        if result_cache:
+            tournament_stats["result_cache"] = {
+                "cached": cached_sessions,
+                "run": len(pending_jobs),
+            }
+            print(
+                f"Result cache: {cached_sessions} sessions served from cache, "
+                f"{len(pending_jobs)} sessions to run"
+            )
 
-            # add bid utility of both agents if bid is not None
-            bid = action_class.getBid()
-            if bid is None:
+        # longest sessions first, so that no workers are idle at the end of the tournament
+        cost_model = SessionCostModel(cost_history_file)
+        pending_jobs.sort(key=lambda job: cost_model.predict(job[0]), reverse=True)
+
+        num_sessions = len(pending_jobs)
+        if num_sessions > 100:
+            message = f"WARNING: this would run {num_sessions} negotiation sessions. Proceed?"
+            if not ask_proceed(message):
+                print("Exiting script")
+                exit()
+
+        # a session is killed if it exceeds its deadline plus a grace period
+        def session_timeout(job):
+            return job[0]["deadline_time_ms"] / 1000 + timeout_grace_s
+
+        # with multiplexing, every worker runs a batch of sessions concurrently
+        job_func = run_session_job
+        if multiplex:
+            if engine != "fast" or deadline_rounds is None:
                 raise ValueError(
-                    f"Found `None` value in sequence of actions: {action_class}"
+                    "Multiplexing requires the fast engine and a round deadline"
                 )
-            else:
-                offer["utilities"] = {
-                    k: float(v.getUtility(bid)) for k, v in utility_funcs.items()
-                }
-
-            results_summary["num_offers"] += 1
-
-        # gather a summary of results
-        if "Accept" in action_dict:
-            utilities_final = list(offer["utilities"].values())
-            result = "agreement"
+            if serve_address or concurrency_range:
+                raise ValueError(
+                    "Multiplexing cannot be combined with remote workers or adaptive "
+                    "concurrency"
+                )
+            if any(
+                tournament_settings.get(option)
+                for option in (
+                    "measure_latency",
+                    "measure_memory",
+                    "measure_phases",
+                    "profile_agents",
+                    "buffered_logs",
+                )
+            ):
+                raise ValueError(
+                    "Multiplexed sessions cannot be instrumented or buffer their logs, "
+                    "as they share the agent classes"
+                )
+            job_func = run_multiplexed_job
+
+        # the number of concurrent sessions is adapted to the health of the sessions
+        controller = None
+        if concurrency_range:
+            if serve_address:
+                raise ValueError("Adaptive concurrency requires local worker processes")
+            controller = ConcurrencyController(*concurrency_range)
+            processes = controller.ceiling
+
+        # sessions run on local worker processes, or on remote workers when serving the jobs
+        if serve_address:
+            pool = WorkQueueCoordinator(serve_address, authkey)
+        elif preload_agents:
+            # import the agents once in this process (inherited by forked workers) and
+            # once at the start of every worker, so that sessions do not pay for imports
+            agent_classes = [agent["class"] for agent in agents]
+            import_times = import_agents(agent_classes)
+            tournament_stats["agent_import_times"] = import_times
+            print_import_times(import_times)
+            pool = SessionPool(
+                job_func,
+                processes,
+                initializer=import_agents,
+                initargs=(agent_classes,),
+                maxtasksperchild=maxtasksperchild,
+                pin_cpus=pin_cpus,
+            )
         else:
-            utilities_final = [0, 0]
-            result = "failed"
-    else:
-        utilities_final = [0, 0]
-        result = "ERROR"
-
-    for i, actor in enumerate(results_dict["connections"]):
-        position = actor.split("_")[-1]
-        results_summary[f"agent_{position}"] = agent_translate[actor]
-        results_summary[f"utility_{position}"] = utilities_final[i]
-    results_summary["nash_product"] = prod(utilities_final)
-    results_summary["social_welfare"] = sum(utilities_final)
-    results_summary["result"] = result
-
-    return results_dict, results_summary
-
-
-def get_utility_function(profile_uri) -> LinearAdditiveUtilitySpace:
-    profile_connection = ProfileConnectionFactory.create(
-        URI(profile_uri), StdOutReporter()
-    )
-    profile = profile_connection.getProfile()
-    assert isinstance(profile, LinearAdditiveUtilitySpace)
-
-    return profile
-
-
-def process_tournament_results(tournament_results):
-    agent_result_raw = defaultdict(lambda: defaultdict(list))
-    tournament_results_summary = defaultdict(lambda: defaultdict(int))
-    for session_results in tournament_results:
-        agents = {k: v for k, v in session_results.items() if k.startswith("agent")}
-        for agent_id, agent_class in agents.items():
-            agent_result_raw[agent_class]["utility"].append(
-                session_results[f"utility_{agent_id.split('_')[1]}"]
+            pool = SessionPool(
+                job_func,
+                processes,
+                maxtasksperchild=maxtasksperchild,
+                pin_cpus=pin_cpus,
             )
-            agent_result_raw[agent_class]["nash_product"].append(
-                session_results["nash_product"]
+
+        def update_worker_rss(worker):
+            # largest resident set size per worker process, to size the number of workers
+            if worker and worker["rss_mb"] is not None:
+                worker_rss = tournament_stats.setdefault("worker_rss_mb", {})
+                pid = str(worker["pid"])
+                worker_rss[pid] = max(worker_rss.get(pid, 0), worker["rss_mb"])
+
+        def finish_session(job, result, error):
+            nonlocal num_finished
+            if error is None:
+                settings, session_results_summary = result["settings"], result["summary"]
+                # multiplexed sessions share a process, their time says little about their cost
+                if not multiplex:
+                    cost_model.update(settings, result["elapsed_s"])
+                for k, v in result.get("profile_cache", {}).items():
+                    tournament_stats["profile_cache"][k] += v
+                update_worker_rss(result.get("worker"))
+                # time per phase of the sessions that were run in this tournament
+                for k, v in session_results_summary.items():
+                    if k.startswith("phase_"):
+                        phases_ms = tournament_stats.setdefault("phases_ms", {})
+                        phases_ms[k] = phases_ms.get(k, 0) + v
+                # failed sessions (including crashed agents) are not cached, they are
+                # run again next time
+                if result_cache and session_results_summary["result"] != "ERROR":
+                    result_cache.put(
+                        cache_keys[session_key(settings)],
+                        session_results_summary,
+                        result["trace_file"],
+                    )
+            else:
+                settings = job[0]
+                print(f"Session failed ({settings['agents']}):\n{error}")
+                session_results_summary = failed_session_summary(settings, error)
+                if error == "timeout" and not multiplex:
+                    cost_model.update(settings, session_timeout(job))
+
+            journal.append(session_key(settings), settings, session_results_summary)
+            add_session(settings, session_results_summary)
+
+            # keep the summary on disk up to date while the tournament is running
+            tournament_summary.to_dataframe().to_csv(
+                results_dir.joinpath("tournament_results_summary.csv")
             )
-            agent_result_raw[agent_class]["social_welfare"].append(
-                session_results["social_welfare"]
+
+            agent_names = [
+                v for k, v in session_results_summary.items() if k.startswith("agent")
+            ]
+            num_finished += 1
+            print(
+                f"[{num_finished}/{num_sessions}] {' - '.join(agent_names)}: "
+                f"{session_results_summary['result']} "
+                f"({session_results_summary.get('num_rounds', 0)} rounds)"
             )
-            if "num_offers" in session_results:
-                agent_result_raw[agent_class]["num_offers"].append(
-                    session_results["num_offers"]
+
+        num_finished = 0
+        with pool, journal:
+            if controller:
+                # a session of a few agent pairs runs alone, as baseline for the
+                # rounds per second the pairs achieve without competing sessions
+                baseline_jobs, pending_jobs = split_baseline_jobs(
+                    pending_jobs, baseline_pairs
                 )
-            tournament_results_summary[agent_class][session_results["result"]] += 1
-
-    for agent, stats in agent_result_raw.items():
-        num_session = len(stats["utility"])
-        for desc, stat in stats.items():
-            stat_average = sum(stat) / num_session
-            tournament_results_summary[agent][f"avg_{desc}"] = stat_average
-        tournament_results_summary[agent]["count"] = num_session
-
-    column_order = [
-        "avg_utility",
-        "avg_nash_product",
-        "avg_social_welfare",
-        "avg_num_offers",
-        "count",
-        "agreement",
-        "failed",
-        "ERROR",
-    ]
-    column_type = {
-        "count": int,
-        "agreement": int,
-        "failed": int,
-        "ERROR": int,
-    }
+                print(f"Running {len(baseline_jobs)} baseline sessions serially")
+                pool.concurrency = 1
+                for job, result, error in pool.imap_unordered(
+                    baseline_jobs, session_timeout
+                ):
+                    finish_session(job, result, error)
+                    if error is None:
+                        controller.set_baseline(
+                            result["settings"],
+                            result["summary"]["num_rounds"],
+                            result["elapsed_s"],
+                        )
+                pool.concurrency = controller.concurrency
+
+            if multiplex:
+                batches = [
+                    pending_jobs[i : i + multiplex]
+                    for i in range(0, len(pending_jobs), multiplex)
+                ]
+                results = pool.imap_unordered(
+                    batches, lambda batch: max(session_timeout(job) for job in batch)
+                )
+                for batch, batch_result, error in results:
+                    if error is not None:
+                        for job in batch:
+                            finish_session(job, None, error)
+                        continue
+                    for k, v in batch_result["profile_cache"].items():
+                        tournament_stats["profile_cache"][k] += v
+                    update_worker_rss(batch_result.get("worker"))
+                    for job, (result, session_error) in zip(
+                        batch, batch_result["sessions"]
+                    ):
+                        finish_session(job, result, session_error)
+            else:
+                results = pool.imap_unordered(pending_jobs, session_timeout)
+                for job, result, error in results:
+                    finish_session(job, result, error)
+                    if controller and error is None:
+                        concurrency = controller.update(
+                            result["settings"],
+                            result["summary"]["num_rounds"],
+                            result["elapsed_s"],
+                        )
+                        if concurrency != pool.concurrency:
+                            health = controller.history[-1]["health"]
+                            print(
+                                f"Concurrency: {pool.concurrency} -> {concurrency} "
+                                f"(health {health:.2f})"
+                            )
+                            pool.concurrency = concurrency
+
+        if controller:
+            tournament_stats["concurrency"] = controller.history
+
+    cost_model.save()
+
+    if tournament_settings.get("profile_agents"):
+        report_file = write_profile_report(tournament_settings["profile_agents"])
+        if report_file:
+            print(f"Agent profile report: {report_file}")
+        else:
+            print("No agent profiles were saved, skipping the profile report")
 
-    # results dictionary to dataframe
-    tournament_results_summary = pd.DataFrame(tournament_results_summary).T
+    print(
+        f"Profile cache: {tournament_stats['profile_cache']['hits']} hits, "
+        f"{tournament_stats['profile_cache']['misses']} misses"
+    )
+    if "phases_ms" in tournament_stats:
+        print(format_phase_breakdown(tournament_stats["phases_ms"]))
+    if "worker_rss_mb" in tournament_stats:
+        print(
+            f"Worker memory: {max(tournament_stats['worker_rss_mb'].values()):.0f} MB "
+            f"peak resident set size"
+        )
+    with open(results_dir.joinpath("tournament_stats.json"), "w", encoding="utf-8") as f:
+        f.write(json.dumps(tournament_stats, indent=2))
+
+    tournament_results_summary = tournament_summary.to_dataframe()
+    tournament_results_summary.to_csv(
+        results_dir.joinpath("tournament_results_summary.csv")
+    )
 
-    # clean data and types
-    tournament_results_summary = tournament_results_summary.fillna(0)
-    for column in column_order:
-        if column not in tournament_results_summary:
-            tournament_results_summary[column] = 0
-    tournament_results_summary = tournament_results_summary.astype(column_type)
+    return tournament_results_summary
 
-    # structure dataframe
-    tournament_results_summary.sort_values("avg_utility", ascending=False, inplace=True)
-    tournament_results_summary = tournament_results_summary[column_order]
 
-    return tournament_results_summary
+def run_tournament_worker(
+    address: Tuple[str, int],
+    authkey: bytes,
+    processes: int = None,
+    pin_cpus: bool = False,
+):
+    # run the sessions of a tournament that is served by another host (see `run_tournament`)
+    run_worker(run_session_job, address, authkey, processes, pin_cpus=pin_cpus)
+
+
+def import_agents(agent_classes: list) -> dict:
+    """Import the modules of the agent classes.
+
+    Args:
+        agent_classes (list): class paths of the agents
+
+    Returns:
+        dict: import time in seconds per agent class, dependencies that are shared
+            between agents are attributed to the first agent that imports them.
+    """
+    import_times = {}
+    for agent_class in agent_classes:
+        module_name, class_name = agent_class.rsplit(".", 1)
+        start_time = time.perf_counter()
+        getattr(importlib.import_module(module_name), class_name)
+        import_times[agent_class] = time.perf_counter() - start_time
+
+    return import_times
+
+
+def print_import_times(import_times: dict):
+    print("Agent import times:")
+    for agent_class, import_time in sorted(
+        import_times.items(), key=lambda x: x[1], reverse=True
+    ):
+        print(f"  {import_time:8.3f} s  {agent_class}")
+
+
+def split_baseline_jobs(
+    jobs: list, max_pairs: int = BASELINE_PAIRS
+) -> Tuple[list, list]:
+    # a job of up to `max_pairs` agent pairs and the remaining jobs, pairs of agents
+    # that are not in a baseline pair yet are preferred, to cover as many agents as
+    # possible
+    baseline_jobs, pairs, agents = [], set(), set()
+    for min_new_agents in (2, 1, 0):
+        for job in jobs:
+            if len(pairs) >= max_pairs:
+                break
+            pair = agent_pair(job[0])
+            if pair not in pairs and len(set(pair) - agents) >= min_new_agents:
+                pairs.add(pair)
+                agents.update(pair)
+                baseline_jobs.append(job)
+
+    baseline_ids = {id(job) for job in baseline_jobs}
+    other_jobs = [job for job in jobs if id(job) not in baseline_ids]
+    return baseline_jobs, other_jobs
+
+
+def failed_session_summary(settings: dict, error: str) -> dict:
+    # summary of a session that did not return any results, similar to a crashed session
+    results_summary = {"num_offers": 0, "num_rounds": 0}
+    for i, agent in enumerate(settings["agents"], 1):
+        results_summary[f"agent_{i}"] = agent["class"].split(".")[-1]
+        results_summary[f"utility_{i}"] = 0
+    results_summary["nash_product"] = 0
+    results_summary["social_welfare"] = 0
+    results_summary["result"] = "ERROR"
+    results_summary["error"] = error.strip().splitlines()[-1]
+
+    return results_summary
+
+
+class JsonListWriter:
+    """Writes a JSON list to file one element at a time."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+        self._empty = True
+
+    def __enter__(self):
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write("[")
+        return self
+
+    def __exit__(self, *exc):
+        self._file.write("\n]" if not self._empty else "]")
+        self._file.close()
+        self._file = None
+
+    def write(self, element):
+        separator = "\n" if self._empty else ",\n"
+        self._file.write(separator + json.dumps(element))
+        self._file.flush()
+        self._empty = False
@@ -0,0 +1,265 @@
+import importlib
+import time
+from datetime import datetime
+from decimal import Decimal
+from itertools import count
+from typing import List
+
+from geniusweb.actions.Accept import Accept
+from geniusweb.actions.Action import Action
+from geniusweb.actions.EndNegotiation import EndNegotiation
+from geniusweb.actions.Offer import Offer
+from geniusweb.actions.PartyId import PartyId
+from geniusweb.inform.ActionDone import ActionDone
+from geniusweb.inform.Agreements import Agreements
+from geniusweb.inform.Finished import Finished
+from geniusweb.inform.Settings import Settings
+from geniusweb.inform.YourTurn import YourTurn
+from geniusweb.progress.ProgressRounds import ProgressRounds
+from geniusweb.progress.ProgressTime import ProgressTime
+from geniusweb.references.Parameters import Parameters
+from geniusweb.references.ProfileRef import ProfileRef
+from geniusweb.references.ProtocolRef import ProtocolRef
+from uri.uri import URI
+
+# parties get a unique position suffix within a process, like the geniusweb runner does
+_party_counter = count(1)
+
+
+class SAOPSession:
+    """Lightweight in-process implementation of the Stacked Alternating Offers
+    Protocol. The parties are instantiated directly and receive their informs through
+    plain method calls, so no settings or state have to be (de)serialized.
+
+    The session is step based: `start` sends the settings, every `step` runs a
+    single turn and `finish` informs the parties about the outcome. `run` does all of
+    this at once.
+    """
+
+    def __init__(
+        self,
+        agents: List[dict],
+        profiles: List[str],
+        deadline_time_ms: int,
+        deadline_rounds: int = None,
+    ):
+        self.agents = agents
+        self.profiles = profiles
+        self.deadline_time_ms = deadline_time_ms
+        self.deadline_rounds = deadline_rounds
+
+        self.party_ids = []
+        self.parties = []
+        self.connections = []
+        self.actions = []
+        self.agreement = None
+        self.error = None
+        self.round = 0
+        self.finished = False
+
+        self._turn = 0
+        self._last_offer = None
+        self._end_time = None
+
+    def run(self):
+        self.start()
+        while self.step():
+            pass
+        self.finish()
+
+    def start(self):
+        start_time = time.time()
+        self._end_time = start_time + self.deadline_time_ms / 1000
+        if self.deadline_rounds is not None:
+            progress = ProgressRounds(
+                self.deadline_rounds, 0, datetime.fromtimestamp(self._end_time)
+            )
+        else:
+            progress = ProgressTime(
+                self.deadline_time_ms, datetime.fromtimestamp(start_time)
+            )
+
+        for agent, profile in zip(self.agents, self.profiles):
+            module_name, class_name = agent["class"].rsplit(".", 1)
+            party_class = getattr(importlib.import_module(module_name), class_name)
+            party_id = PartyId(f"{class_name}_{next(_party_counter)}")
+            connection = _PartyConnection(party_id)
+
+            self.party_ids.append(party_id)
+            self.connections.append(connection)
+            try:
+                party = party_class()
+                party.connect(connection)
+                self.parties.append(party)
+                party.notifyChange(
+                    Settings(
+                        party_id,
+                        ProfileRef(URI(profile)),
+                        ProtocolRef(URI("SAOP")),
+                        progress,
+                        Parameters(agent.get("parameters", {})),
+                    )
+                )
+            except Exception as e:
+                self._fail(party_id, e)
+                return
+
+    def step(self) -> bool:
+        """Run a single turn of the party that is next.
+
+        Returns:
+            bool: False if the negotiation has ended
+        """
+        if self.finished:
+            return False
+        if self._deadline_reached():
+            self.finished = True
+            return False
+
+        party_id = self.party_ids[self._turn]
+        connection = self.connections[self._turn]
+        try:
+            self.parties[self._turn].notifyChange(YourTurn())
+        except Exception as e:
+            self._fail(party_id, e)
+            return False
+        action = connection.take_action()
+
+        # actions that arrive after the deadline are ignored
+        if time.time() > self._end_time:
+            self.finished = True
+            return False
+        if not self._is_valid(party_id, action):
+            self.error = f"{party_id} performed an illegal action: {action}"
+            self.finished = True
+            return False
+
+        self.actions.append(action)
+        for other_party_id, party in zip(self.party_ids, self.parties):
+            try:
+                party.notifyChange(ActionDone(action))
+            except Exception as e:
+                self._fail(other_party_id, e)
+                return False
+
+        if isinstance(action, Accept):
+            self.agreement = action.getBid()
+            self.finished = True
+        elif isinstance(action, EndNegotiation):
+            self.finished = True
+        else:
+            self._last_offer = action.getBid()
+            self._turn = (self._turn + 1) % len(self.parties)
+            if self._turn == 0:
+                self.round += 1
+
+        return not self.finished
+
+    def finish(self):
+        self.finished = True
+        agreements = {}
+        if self.agreement is not None:
+            agreements = {party_id: self.agreement for party_id in self.party_ids}
+
+        for party_id, party in zip(self.party_ids, self.parties):
+            try:
+                party.notifyChange(Finished(Agreements(agreements)))
+            except Exception as e:
+                # the outcome is already decided, only keep the first error
+                if self.error is None:
+                    self.error = f"{party_id} {type(e).__name__}: {e}"
+
+    def agent_names(self) -> dict:
+        return {
+            str(party_id): agent["class"].split(".")[-1]
+            for party_id, agent in zip(self.party_ids, self.agents)
+        }
+
+    def trace(self) -> dict:
+        """Trace of the session with the actions in the JSON structure of the geniusweb
+        `SAOPState` (without the protocol settings).
+        """
+        actions = []
+        for action in self.actions:
+            action_fields = {"actor": str(action.getActor())}
+            if isinstance(action, (Offer, Accept)):
+                action_fields["bid"] = {"issuevalues": _bid_values(action.getBid())}
+            actions.append({type(action).__name__: action_fields})
+
+        return {
+            "actions": actions,
+            "connections": [str(party_id) for party_id in self.party_ids],
+            "partyprofiles": {
+                str(party_id): {
+                    "party": {
+                        "partyref": f"pythonpath:{agent['class']}",
+                        "parameters": agent.get("parameters", {}),
+                    },
+                    "profile": profile,
+                }
+                for party_id, agent, profile in zip(
+                    self.party_ids, self.agents, self.profiles
+                )
+            },
+            "error": self.error,
+        }
+
+    def _deadline_reached(self) -> bool:
+        if self.deadline_rounds is not None and self.round >= self.deadline_rounds:
+            return True
+        return time.time() >= self._end_time
+
+    def _is_valid(self, party_id: PartyId, action: Action) -> bool:
+        if action is None or action.getActor() != party_id:
+            return False
+        if isinstance(action, Offer):
+            return action.getBid() is not None
+        if isinstance(action, Accept):
+            return self._last_offer is not None and action.getBid() == self._last_offer
+        return isinstance(action, EndNegotiation)
+
+    def _fail(self, party_id: PartyId, error: Exception):
+        self.error = f"{party_id} {type(error).__name__}: {error}"
+        self.finished = True
+
+
+class _PartyConnection:
+    """Connection end of a party, actions that the party sends are kept until the
+    session takes them.
+    """
+
+    def __init__(self, party_id: PartyId):
+        self.party_id = party_id
+        self._actions = []
+
+    def send(self, action: Action):
+        self._actions.append(action)
+
+    def take_action(self) -> Action:
+        return self._actions.pop(0) if self._actions else None
+
+    def getReference(self):
+        return None
+
+    def getRemoteURI(self):
+        return None
+
+    def getError(self):
+        return None
+
+    def addListener(self, listener):
+        pass
+
+    def removeListener(self, listener):
+        pass
+
+    def close(self):
+        pass
+
+
+def _bid_values(bid) -> dict:
+    issue_values = {}
+    for issue, value in bid.getIssueValues().items():
+        value = value.getValue()
+        issue_values[issue] = float(value) if isinstance(value, Decimal) else value
+    return issue_values
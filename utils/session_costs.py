@@ -0,0 +1,78 @@
+import json
+from functools import lru_cache
+from math import exp, log, prod, sqrt
+from pathlib import Path
+
+# rough cost in seconds per bid in the domain for two agents that enumerate the bid space
+BID_COST_S = 0.001
+# learning rate of the per-agent cost factors
+LEARNING_RATE = 0.3
+
+
+@lru_cache(maxsize=None)
+def domain_size(profile_file: str) -> int:
+    """Number of bids in the domain of a profile. Uses the size in the specials.json
+    of the domain directory if available, otherwise it is computed from the profile.
+
+    Args:
+        profile_file (str): path to a profile json file
+
+    Returns:
+        int: number of bids in the domain
+    """
+    specials_file = Path(profile_file).parent.joinpath("specials.json")
+    if specials_file.exists():
+        with open(specials_file, "r", encoding="utf-8") as f:
+            return json.load(f)["size"]
+
+    with open(profile_file, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    issues_values = profile["LinearAdditiveUtilitySpace"]["domain"]["issuesValues"]
+    return prod(len(v["values"]) for v in issues_values.values())
+
+
+class SessionCostModel:
+    """Predicts the wall-clock time of a negotiation session to schedule the most
+    expensive sessions first.
+
+    The base prediction is the deadline plus a cost proportional to the domain size.
+    It is multiplied by the geometric mean of a cost factor per agent class. These
+    factors are learned from measured session times and stored in a history file,
+    so predictions improve over consecutive tournaments.
+    """
+
+    def __init__(self, history_file: Path = None):
+        self.history_file = history_file
+        self.agent_factors = {}
+
+        if history_file and history_file.exists():
+            with open(history_file, "r", encoding="utf-8") as f:
+                self.agent_factors = json.load(f)
+
+    def predict(self, settings: dict) -> float:
+        factors = [self._agent_factor(agent) for agent in settings["agents"]]
+        return self._base_cost(settings) * sqrt(prod(factors))
+
+    def update(self, settings: dict, elapsed_s: float):
+        # move the factors of both agents towards the observed/predicted ratio (in log space)
+        log_ratio = log(max(elapsed_s, 1e-3) / self.predict(settings))
+        for agent in settings["agents"]:
+            agent_class = agent["class"].split(".")[-1]
+            factor = self._agent_factor(agent) * exp(LEARNING_RATE * log_ratio)
+            self.agent_factors[agent_class] = factor
+
+    def save(self):
+        if not self.history_file:
+            return
+        if not self.history_file.parent.exists():
+            self.history_file.parent.mkdir(parents=True)
+        with open(self.history_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.agent_factors, indent=2, sort_keys=True))
+
+    def _agent_factor(self, agent: dict) -> float:
+        return self.agent_factors.get(agent["class"].split(".")[-1], 1.0)
+
+    @staticmethod
+    def _base_cost(settings: dict) -> float:
+        size = domain_size(settings["profiles"][0])
+        return settings["deadline_time_ms"] / 1000 + size * BID_COST_S
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+def session_key(settings: dict) -> str:
+    """Stable identifier of a negotiation session, based on the agents (including
+    their parameters), the profiles, the deadlines, the repetition index and the engine.
+
+    Args:
+        settings (dict): session settings as passed to `run_session`
+
+    Returns:
+        str: hexadecimal hash of the session settings
+    """
+    key_data = {
+        "agents": settings["agents"],
+        "profiles": settings["profiles"],
+        "deadline_time_ms": settings["deadline_time_ms"],
+        "deadline_rounds": settings.get("deadline_rounds"),
+        "repetition": settings.get("repetition", 0),
+        "engine": settings.get("engine", "geniusweb"),
+    }
+    key_json = json.dumps(key_data, sort_keys=True)
+    return hashlib.sha1(key_json.encode("utf-8")).hexdigest()
+
+
+class SessionJournal:
+    """Append-only journal with one JSON record per finished negotiation session.
+    Every record is flushed to disk as soon as it is written, so a crashed or
+    interrupted tournament can be resumed from the sessions that did finish.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+
+    def __enter__(self):
+        # terminate an incomplete last record so new records start on a fresh line
+        if self.path.exists() and self.path.stat().st_size > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                incomplete = f.read(1) != b"\n"
+        else:
+            incomplete = False
+
+        self._file = open(self.path, "a", encoding="utf-8")
+        if incomplete:
+            self._file.write("\n")
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+        self._file = None
+
+    def records(self):
+        """Iterate over all complete records in the journal, without loading the
+        whole journal into memory.
+
+        Yields:
+            dict: journal record with session key, settings and result summary
+        """
+        if not self.path.exists():
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # last line can be incomplete if the previous run was killed while writing
+                    continue
+
+    def append(self, key: str, settings: dict, results_summary: dict):
+        record = {"key": key, "settings": settings, "summary": results_summary}
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
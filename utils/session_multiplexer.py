@@ -0,0 +1,56 @@
+import asyncio
+import time
+from typing import List
+
+from utils.runners import check_rounds_support, create_storage_dirs, process_fast_session
+from utils.saop_engine import SAOPSession
+
+
+def run_multiplexed(sessions_settings: List[dict]) -> list:
+    """Run many round-based negotiation sessions concurrently in this process. The
+    sessions run on the in-process SAOP engine and take turns on a single asyncio
+    event loop: after every turn, control goes back to the loop so the next session
+    can take its turn.
+
+    Only sessions with a round deadline are supported, as the wall-clock time of a
+    session depends on the number of sessions it shares the process with (the time
+    deadline is kept as safety limit).
+
+    Args:
+        sessions_settings (List[dict]): session settings as passed to `run_session`
+
+    Returns:
+        list: per session a tuple of the results trace, the results summary and the
+            elapsed time in seconds, or the exception the session raised
+    """
+    return asyncio.run(_run_all(sessions_settings))
+
+
+async def _run_all(sessions_settings: List[dict]) -> list:
+    sessions = [_run_session(settings) for settings in sessions_settings]
+    return await asyncio.gather(*sessions, return_exceptions=True)
+
+
+async def _run_session(settings: dict):
+    if settings.get("deadline_rounds") is None:
+        raise ValueError("Multiplexed sessions require a round deadline")
+    check_rounds_support(settings["agents"])
+    create_storage_dirs(settings["agents"])
+
+    session = SAOPSession(
+        settings["agents"],
+        [f"file:{x}" for x in settings["profiles"]],
+        settings["deadline_time_ms"],
+        settings["deadline_rounds"],
+    )
+
+    start_time = time.time()
+    session.start()
+    while session.step():
+        # give the other sessions their turn
+        await asyncio.sleep(0)
+    session.finish()
+    elapsed_s = time.time() - start_time
+
+    results_trace, results_summary = process_fast_session(session)
+    return results_trace, results_summary, elapsed_s
@@ -0,0 +1,267 @@
+import os
+import time
+import traceback
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from typing import Callable, Iterable, Iterator, Tuple
+
+_NO_JOBS_LEFT = object()
+
+# environment variables that limit the thread pools of BLAS and OpenMP libraries
+THREAD_LIMIT_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+class SessionPool:
+    """Process pool that runs one job at a time per worker process and enforces a
+    hard wall-clock budget per job. Workers that exceed their budget (or die) are
+    killed and replaced, without interrupting the jobs running on other workers.
+
+    Every worker has its own pipe to the parent process, so killing a worker can
+    never leave a shared queue in a locked state.
+
+    With `pin_cpus`, every worker is pinned to its own CPU core and the thread pools
+    of BLAS/OpenMP libraries in the worker are limited to a single thread, so parallel
+    sessions do not compete for cores (replacement workers take over the core).
+
+    The number of jobs that run at the same time can be lowered below the number of
+    processes by setting `concurrency`, also while iterating over results.
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        processes: int = None,
+        initializer: Callable = None,
+        initargs: tuple = (),
+        maxtasksperchild: int = None,
+        pin_cpus: bool = False,
+    ):
+        self.func = func
+        self.initializer = initializer
+        self.initargs = initargs
+        self.maxtasksperchild = maxtasksperchild
+        self._context = get_context()
+        self._workers = []
+
+        if pin_cpus:
+            # only use the cores this process is allowed to run on
+            available_cpus = sorted(os.sched_getaffinity(0))
+            self.processes = processes or len(available_cpus)
+            if self.processes > len(available_cpus):
+                raise ValueError(
+                    f"Cannot pin {self.processes} workers to {len(available_cpus)} CPUs"
+                )
+            self._cpus = available_cpus[: self.processes]
+        else:
+            self.processes = processes or os.cpu_count()
+            self._cpus = [None] * self.processes
+        self.concurrency = self.processes
+
+    def __enter__(self):
+        self._workers = [self._start_worker(cpu) for cpu in self._cpus]
+        return self
+
+    def __exit__(self, *exc):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def imap_unordered(
+        self, jobs: Iterable, timeout: Callable[[object], float]
+    ) -> Iterator[Tuple[object, object, str]]:
+        """Run all jobs and yield the results in order of completion.
+
+        Args:
+            jobs (Iterable): arguments to call the pool function with, dispatched in this order.
+                Can yield None if no job is available yet, the pool will then ask again later.
+            timeout (Callable[[object], float]): returns the wall-clock budget in seconds of a job
+
+        Yields:
+            Tuple[object, object, str]: job, result of the job (None on failure) and error
+                message (None on success, "timeout" if the budget was exceeded)
+        """
+        jobs = iter(jobs)
+        jobs_left = True
+
+        while True:
+            # hand out jobs to idle workers
+            num_busy = sum(w.job is not None for w in self._workers)
+            for worker in list(self._workers):
+                if worker.job is not None or not jobs_left:
+                    continue
+                if num_busy >= self.concurrency:
+                    break
+                job = next(jobs, _NO_JOBS_LEFT)
+                if job is _NO_JOBS_LEFT:
+                    jobs_left = False
+                elif job is None:
+                    break
+                else:
+                    # a worker can die while idle (e.g. killed for memory or a crashed
+                    # initializer), the job then goes to a fresh worker instead
+                    if not worker.process.is_alive():
+                        worker = self._replace_worker(worker)
+                    worker.submit(job, time.monotonic() + timeout(job))
+                    num_busy += 1
+
+            busy_workers = [w for w in self._workers if w.job is not None]
+            if not busy_workers:
+                if not jobs_left:
+                    break
+                # no job available yet, ask again later
+                time.sleep(1.0)
+                continue
+
+            # wait for a result, but not past the first deadline
+            next_deadline = min(w.deadline for w in busy_workers)
+            wait_time = min(max(next_deadline - time.monotonic(), 0.0), 1.0)
+            ready = wait([w.conn for w in busy_workers], timeout=wait_time)
+
+            finished = []
+            for worker in busy_workers:
+                if worker.conn in ready:
+                    job = worker.job
+                    try:
+                        success, result = worker.conn.recv()
+                    except (EOFError, OSError):
+                        worker.process.join(1)
+                        error = f"worker exited with code {worker.process.exitcode}"
+                        finished.append((job, None, error))
+                        self._replace_worker(worker)
+                        continue
+                    worker.job = None
+                    if success:
+                        finished.append((job, result, None))
+                    else:
+                        finished.append((job, None, result))
+
+                    # replace workers after a number of jobs, to bound memory leaks
+                    worker.tasks_done += 1
+                    if self.maxtasksperchild and worker.tasks_done >= self.maxtasksperchild:
+                        self._replace_worker(worker)
+                elif time.monotonic() > worker.deadline:
+                    # hung or runaway job, kill the worker and start a fresh one
+                    finished.append((worker.job, None, "timeout"))
+                    self._replace_worker(worker)
+
+            yield from finished
+
+    def _start_worker(self, cpu: int = None) -> "_Worker":
+        return _Worker(self._context, self.func, self.initializer, self.initargs, cpu)
+
+    def _replace_worker(self, worker: "_Worker") -> "_Worker":
+        worker.stop()
+        new_worker = self._start_worker(worker.cpu)
+        self._workers[self._workers.index(worker)] = new_worker
+        return new_worker
+
+
+class _Worker:
+    def __init__(
+        self,
+        context,
+        func: Callable,
+        initializer: Callable,
+        initargs: tuple,
+        cpu: int = None,
+    ):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_loop,
+            args=(func, child_conn, initializer, initargs, cpu),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        self.cpu = cpu
+        self.job = None
+        self.deadline = None
+        self.tasks_done = 0
+
+    def submit(self, job, deadline: float):
+        self.job = job
+        self.deadline = deadline
+        try:
+            self.conn.send(job)
+        except OSError:
+            # the worker died, the job is reported as failed when the pool reads the
+            # closed pipe and the worker is replaced
+            pass
+
+    def stop(self):
+        if self.process.is_alive() and self.job is None:
+            # ask an idle worker to exit cleanly
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.job = None
+
+
+def _worker_loop(
+    func: Callable, conn, initializer: Callable, initargs: tuple, cpu: int
+):
+    if cpu is not None:
+        _pin_to_cpu(cpu)
+    if initializer is not None:
+        initializer(*initargs)
+
+    parent_pid = os.getppid()
+    while True:
+        job = _receive_job(conn, parent_pid)
+        if job is None:
+            break
+
+        try:
+            result = (True, func(job))
+        except Exception:
+            result = (False, traceback.format_exc())
+        try:
+            conn.send(result)
+        except OSError:
+            break
+
+    conn.close()
+
+
+def _receive_job(conn, parent_pid: int):
+    # returns None when the parent process asks the worker to exit or is gone (e.g. a
+    # killed remote worker). Forked workers can hold copies of the parent's ends of the
+    # pipes and then never see their pipe close, so the parent is checked as well.
+    try:
+        while not conn.poll(1.0):
+            if os.getppid() != parent_pid:
+                return None
+        return conn.recv()
+    except (EOFError, OSError):
+        return None
+
+
+def _pin_to_cpu(cpu: int):
+    os.sched_setaffinity(0, {cpu})
+
+    # libraries that are loaded after this read the limits from the environment
+    for env_var in THREAD_LIMIT_ENV_VARS:
+        os.environ[env_var] = "1"
+    # thread pools of libraries that are already loaded (e.g. NumPy in a forked
+    # worker) have to be limited at runtime
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(1)
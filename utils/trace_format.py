@@ -0,0 +1,172 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+TRACE_FORMATS = ("json", "npz")
+
+
+def save_trace(results_trace: dict, trace_file, trace_format: str = "json") -> Path:
+    """Save a session results trace, either as (indented) JSON or as a compressed
+    columnar `.npz` file. The file extension is set according to the format.
+
+    Args:
+        results_trace (dict): session results trace as returned by `run_session`
+        trace_file (str | Path): path to save the trace to
+        trace_format (str, optional): "json" or "npz". Defaults to "json".
+
+    Returns:
+        Path: path of the saved trace
+    """
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format: {trace_format}")
+    trace_file = Path(trace_file).with_suffix(f".{trace_format}")
+
+    if trace_format == "json":
+        with open(trace_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps(results_trace, indent=2))
+    else:
+        np.savez_compressed(trace_file, **encode_trace(results_trace))
+
+    return trace_file
+
+
+def load_trace(trace_file) -> dict:
+    """Load a session results trace saved with `save_trace` in the original JSON
+    structure.
+
+    Args:
+        trace_file (str | Path): path to a `.json` or `.npz` trace file
+
+    Returns:
+        dict: session results trace
+    """
+    trace_file = Path(trace_file)
+    if trace_file.suffix == ".npz":
+        with np.load(trace_file) as columns:
+            return decode_trace(dict(columns))
+
+    with open(trace_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def encode_trace(results_trace: dict) -> dict:
+    """Encode the actions of a trace as columns: actor, action type, bid (as value
+    index per issue), utility per party. All other fields are kept as JSON.
+    """
+    actions = results_trace["actions"]
+    actors, action_types, issues, parties = {}, {}, {}, {}
+    issue_values = []
+    # actions with other fields than actor, bid and utilities are stored as is
+    raw_actions = {}
+
+    actor_column, type_column, bid_rows, utility_rows = [], [], [], []
+    for i, action in enumerate(actions):
+        action_type, action_fields = next(iter(action.items()), (None, None))
+        if (
+            len(action) != 1
+            or not isinstance(action_fields, dict)
+            or set(action_fields) - {"actor", "bid", "utilities"}
+        ):
+            raw_actions[str(i)] = action
+            actor_column.append(-1)
+            type_column.append(-1)
+            bid_rows.append(None)
+            utility_rows.append(None)
+            continue
+
+        actor_column.append(actors.setdefault(action_fields.get("actor"), len(actors)))
+        type_column.append(action_types.setdefault(action_type, len(action_types)))
+
+        bid = action_fields.get("bid")
+        bid_row = {}
+        if bid is not None:
+            for issue, value in bid["issuevalues"].items():
+                if issue not in issues:
+                    issues[issue] = len(issues)
+                    issue_values.append({})
+                values = issue_values[issues[issue]]
+                bid_row[issues[issue]] = values.setdefault(value, len(values))
+        bid_rows.append(bid_row if bid is not None else None)
+
+        utilities = action_fields.get("utilities")
+        if utilities is not None:
+            for party in utilities:
+                parties.setdefault(party, len(parties))
+        utility_rows.append(utilities)
+
+    bids = np.full((len(actions), len(issues)), -1, dtype=np.int32)
+    has_bid = np.zeros(len(actions), dtype=bool)
+    for i, bid_row in enumerate(bid_rows):
+        if bid_row is not None:
+            has_bid[i] = True
+            for column, value_index in bid_row.items():
+                bids[i, column] = value_index
+
+    utilities = np.full((len(actions), len(parties)), np.nan, dtype=np.float64)
+    has_utilities = np.zeros(len(actions), dtype=bool)
+    for i, utility_row in enumerate(utility_rows):
+        if utility_row is not None:
+            has_utilities[i] = True
+            for party, utility in utility_row.items():
+                utilities[i, parties[party]] = utility
+
+    metadata = {k: v for k, v in results_trace.items() if k != "actions"}
+    metadata["__columns__"] = {
+        "keys": list(results_trace),
+        "actors": list(actors),
+        "action_types": list(action_types),
+        "issues": list(issues),
+        "values": [list(values) for values in issue_values],
+        "parties": list(parties),
+        "raw_actions": raw_actions,
+    }
+
+    return {
+        "metadata": np.array(json.dumps(metadata)),
+        "actor": np.array(actor_column, dtype=np.int16),
+        "action_type": np.array(type_column, dtype=np.int8),
+        "bid": bids,
+        "has_bid": has_bid,
+        "utilities": utilities,
+        "has_utilities": has_utilities,
+    }
+
+
+def decode_trace(columns: dict) -> dict:
+    """Reconstruct the JSON structure of a trace from the columns of `encode_trace`."""
+    metadata = json.loads(str(columns["metadata"]))
+    encoding = metadata.pop("__columns__")
+    actors, action_types = encoding["actors"], encoding["action_types"]
+    issues, values, parties = encoding["issues"], encoding["values"], encoding["parties"]
+
+    actions = []
+    for i in range(len(columns["actor"])):
+        if str(i) in encoding["raw_actions"]:
+            actions.append(encoding["raw_actions"][str(i)])
+            continue
+
+        action_fields = {}
+        actor = actors[columns["actor"][i]]
+        if actor is not None:
+            action_fields["actor"] = actor
+        if columns["has_bid"][i]:
+            action_fields["bid"] = {
+                "issuevalues": {
+                    issue: values[column][value_index]
+                    for column, (issue, value_index) in enumerate(
+                        zip(issues, columns["bid"][i].tolist())
+                    )
+                    if value_index >= 0
+                }
+            }
+        if columns["has_utilities"][i]:
+            action_fields["utilities"] = {
+                party: float(utility)
+                for party, utility in zip(parties, columns["utilities"][i].tolist())
+                if not np.isnan(utility)
+            }
+        actions.append({action_types[columns["action_type"][i]]: action_fields})
+
+    metadata["actions"] = actions
+    return {k: metadata[k] for k in encoding["keys"]}
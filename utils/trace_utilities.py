@@ -0,0 +1,82 @@
+from typing import List, Union
+
+import numpy as np
+from geniusweb.issuevalue.Bid import Bid
+from geniusweb.profile.utilityspace.LinearAdditiveUtilitySpace import (
+    LinearAdditiveUtilitySpace,
+)
+
+
+class UtilityArrays:
+    """LinearAdditiveUtilitySpace compiled to one array of weighted value utilities
+    per issue, so that the utilities of many bids can be computed with NumPy instead
+    of Decimal arithmetic per bid.
+    """
+
+    def __init__(self, profile: LinearAdditiveUtilitySpace):
+        self.issues = sorted(profile.getUtilities().keys())
+        self.value_indices = []
+        self.weighted_utilities = []
+
+        for issue in self.issues:
+            value_utilities = profile.getUtilities()[issue].getUtilities()
+            weight = float(profile.getWeight(issue))
+            values = list(value_utilities.keys())
+
+            self.value_indices.append({value: i for i, value in enumerate(values)})
+            # the last element is used for missing or unknown values, which have no utility
+            self.weighted_utilities.append(
+                np.array(
+                    [weight * float(value_utilities[v]) for v in values] + [0.0],
+                    dtype=np.float64,
+                )
+            )
+
+    def encode(self, bids: List[Bid]) -> np.ndarray:
+        """Encode bids as a matrix of value indices, one row per bid and one column per
+        issue. Missing or unknown values are encoded as -1.
+        """
+        rows = []
+        for bid in bids:
+            issue_values = bid.getIssueValues()
+            rows.append(
+                [
+                    value_index.get(issue_values.get(issue), -1)
+                    for issue, value_index in zip(self.issues, self.value_indices)
+                ]
+            )
+        return np.array(rows, dtype=np.int64).reshape(len(bids), len(self.issues))
+
+    def get_utilities(self, bid_matrix: np.ndarray) -> np.ndarray:
+        utilities = np.zeros(bid_matrix.shape[0], dtype=np.float64)
+        for column, weighted_utilities in enumerate(self.weighted_utilities):
+            utilities += weighted_utilities[bid_matrix[:, column]]
+        return utilities
+
+
+def bid_utilities(
+    profile: Union[LinearAdditiveUtilitySpace, UtilityArrays], bids: List[Bid]
+) -> np.ndarray:
+    """Utilities of a sequence of bids (e.g. all offers of a negotiation trace).
+    Repeated bids are only encoded once.
+
+    Args:
+        profile (LinearAdditiveUtilitySpace | UtilityArrays): profile to compute the
+            utilities with, pass the compiled profile to reuse it between calls
+        bids (List[Bid]): bids to compute the utilities of
+
+    Returns:
+        np.ndarray: utility of every bid, equal to `float(profile.getUtility(bid))`
+            within floating point tolerance
+    """
+    unique_bids = {}
+    bid_rows = np.array(
+        [unique_bids.setdefault(bid, len(unique_bids)) for bid in bids], dtype=np.int64
+    )
+
+    if isinstance(profile, UtilityArrays):
+        utility_arrays = profile
+    else:
+        utility_arrays = UtilityArrays(profile)
+    bid_matrix = utility_arrays.encode(list(unique_bids.keys()))
+    return utility_arrays.get_utilities(bid_matrix)[bid_rows]
@@ -0,0 +1,210 @@
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from functools import partial
+from multiprocessing.managers import BaseManager
+from typing import Callable, Iterable, Iterator, Tuple
+
+from utils.session_pool import SessionPool
+
+
+class JobQueue:
+    """Job list of a tournament that is served to remote workers. Jobs are leased to
+    the worker that takes them. If a worker stops sending heartbeats, its leased
+    jobs are put back in the queue for other workers.
+    """
+
+    def __init__(self, lease_timeout_s: float):
+        self.lease_timeout_s = lease_timeout_s
+        self._jobs = []
+        self._budgets = []
+        self._pending = deque()
+        self._leases = {}
+        self._heartbeats = {}
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+
+    def submit(self, jobs: list, timeout: Callable[[object], float]):
+        with self._lock:
+            self._jobs = jobs
+            self._budgets = [timeout(job) for job in jobs]
+            self._pending = deque(range(len(jobs)))
+
+    def get_job(self, worker_id: str) -> Tuple[str, tuple]:
+        """Lease the next job to a worker.
+
+        Returns:
+            Tuple[str, tuple]: status ("job", "wait" or "done") and for status "job"
+                the index of the job, the job itself and its wall-clock budget in seconds
+        """
+        with self._lock:
+            self._heartbeats[worker_id] = time.monotonic()
+            self._requeue_expired()
+            if self._pending:
+                index = self._pending.popleft()
+                self._leases[index] = worker_id
+                return "job", (index, self._jobs[index], self._budgets[index])
+            elif self._leases:
+                # other workers are still busy, a job might be re-queued
+                return "wait", None
+            else:
+                return "done", None
+
+    def heartbeat(self, worker_id: str):
+        with self._lock:
+            self._heartbeats[worker_id] = time.monotonic()
+
+    def put_result(self, worker_id: str, index: int, result, error: str):
+        with self._lock:
+            self._heartbeats[worker_id] = time.monotonic()
+            if self._leases.get(index) == worker_id:
+                del self._leases[index]
+            elif index in self._pending:
+                # the lease expired, but the job was not handed out again yet
+                self._pending.remove(index)
+            else:
+                # the job was already re-queued and handed out to another worker
+                return
+            self._results.put((self._jobs[index], result, error))
+
+    def get_result(self, timeout: float) -> tuple:
+        return self._results.get(timeout=timeout)
+
+    def requeue_expired(self):
+        with self._lock:
+            self._requeue_expired()
+
+    def _requeue_expired(self):
+        now = time.monotonic()
+        dead_workers = {
+            worker_id
+            for worker_id, last_seen in self._heartbeats.items()
+            if now - last_seen > self.lease_timeout_s
+        }
+        for worker_id in dead_workers:
+            del self._heartbeats[worker_id]
+            print(f"Lost connection to worker {worker_id}, re-queuing its jobs")
+
+        for index, worker_id in list(self._leases.items()):
+            if worker_id in dead_workers:
+                del self._leases[index]
+                self._pending.appendleft(index)
+
+
+class _WorkQueueManager(BaseManager):
+    pass
+
+
+class WorkQueueCoordinator:
+    """Serves jobs to remote workers (see `run_worker`) instead of running them
+    locally. Has the same interface as `SessionPool`, so it can be used as a drop-in
+    replacement by the tournament runner.
+    """
+
+    def __init__(
+        self, address: Tuple[str, int], authkey: bytes, lease_timeout_s: float = 60.0
+    ):
+        self.address = address
+        self.authkey = authkey
+        self._job_queue = JobQueue(lease_timeout_s)
+        self._server = None
+
+    def __enter__(self):
+        _WorkQueueManager.register(
+            "get_job_queue",
+            callable=lambda: self._job_queue,
+            exposed=("get_job", "heartbeat", "put_result"),
+        )
+        manager = _WorkQueueManager(address=self.address, authkey=self.authkey)
+        self._server = manager.get_server()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Serving tournament jobs on {self.address[0]}:{self.address[1]}")
+        return self
+
+    def __exit__(self, *exc):
+        # workers that ask for a new job after this will find the coordinator gone and exit
+        self._server.stop_event.set()
+        self._server.listener.close()
+
+    def imap_unordered(
+        self, jobs: Iterable, timeout: Callable[[object], float]
+    ) -> Iterator[Tuple[object, object, str]]:
+        jobs = list(jobs)
+        self._job_queue.submit(jobs, timeout)
+
+        for _ in range(len(jobs)):
+            while True:
+                try:
+                    yield self._job_queue.get_result(timeout=1.0)
+                    break
+                except queue.Empty:
+                    self._job_queue.requeue_expired()
+
+
+def run_worker(
+    func: Callable,
+    address: Tuple[str, int],
+    authkey: bytes,
+    processes: int = None,
+    heartbeat_interval_s: float = 10.0,
+    pin_cpus: bool = False,
+):
+    """Pull jobs from a `WorkQueueCoordinator` and run them in a local `SessionPool`
+    until the coordinator has no jobs left.
+
+    Args:
+        func (Callable): function to run the jobs with
+        address (Tuple[str, int]): host and port of the coordinator
+        authkey (bytes): authentication key of the coordinator
+        processes (int, optional): number of local worker processes. Defaults to the number of CPUs.
+        heartbeat_interval_s (float, optional): interval of the heartbeats that keep the leases alive.
+        pin_cpus (bool, optional): pin every local worker process to its own CPU core.
+    """
+    _WorkQueueManager.register("get_job_queue")
+    manager = _WorkQueueManager(address=address, authkey=authkey)
+    manager.connect()
+    job_queue = manager.get_job_queue()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    stop_heartbeat = threading.Event()
+
+    def send_heartbeats():
+        while not stop_heartbeat.wait(heartbeat_interval_s):
+            try:
+                job_queue.heartbeat(worker_id)
+            except (ConnectionError, EOFError):
+                return
+
+    def pull_jobs():
+        while True:
+            try:
+                status, leased_job = job_queue.get_job(worker_id)
+            except (ConnectionError, EOFError):
+                return
+            if status == "done":
+                return
+            # no job available right now, the pool will ask again later
+            yield leased_job if status == "job" else None
+
+    threading.Thread(target=send_heartbeats, daemon=True).start()
+    print(f"Worker {worker_id} connected to {address[0]}:{address[1]}")
+
+    try:
+        pool = SessionPool(partial(_run_leased_job, func), processes, pin_cpus=pin_cpus)
+        with pool:
+            results = pool.imap_unordered(pull_jobs(), lambda leased_job: leased_job[2])
+            for leased_job, result, error in results:
+                try:
+                    job_queue.put_result(worker_id, leased_job[0], result, error)
+                except (ConnectionError, EOFError):
+                    break
+    finally:
+        stop_heartbeat.set()
+
+
+def _run_leased_job(func: Callable, leased_job: tuple):
+    _, job, _ = leased_job
+    return func(job)